@@ -0,0 +1,311 @@
+import argparse
+import math
+import time
+
+from sqlalchemy import text
+
+from vector_store import get_registry
+
+INDEX_NAME = "langchain_pg_embedding_ann_idx"
+# rebuilds are built under these names and swapped in
+BUILD_INDEX_NAME = f"{INDEX_NAME}_new"
+OLD_INDEX_NAME = f"{INDEX_NAME}_old"
+TABLE = "langchain_pg_embedding"
+
+
+def _autocommit(engine):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def collection_uuid(conn, collection_name):
+    row = conn.execute(
+        text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+        {"name": collection_name}
+    ).first()
+    if row is None:
+        raise ValueError(f"Collection {collection_name!r} does not exist")
+    return row[0]
+
+
+def vector_dimensions(engine, collection_name):
+    with engine.connect() as conn:
+        cid = collection_uuid(conn, collection_name)
+        row = conn.execute(
+            text(f"SELECT vector_dims(embedding) FROM {TABLE} WHERE collection_id = :cid LIMIT 1"),
+            {"cid": cid}
+        ).first()
+    if row is None:
+        raise ValueError(f"Collection {collection_name!r} is empty")
+    return row[0]
+
+
+def column_type(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(f"""
+            SELECT format_type(a.atttypid, a.atttypmod)
+            FROM pg_attribute a
+            WHERE a.attrelid = '{TABLE}'::regclass AND a.attname = 'embedding'
+        """)).scalar_one()
+
+
+def ensure_fixed_dimensions(engine, dims):
+    """HNSW and IVFFlat need vector(n); PGVector creates an untyped column.
+
+    The ALTER TABLE takes an ACCESS EXCLUSIVE lock and rewrites the whole
+    table, blocking searches and ingestion until it finishes, so it only
+    runs through the fix-dimensions command, never as part of a build.
+    Fails if rows with another dimension exist, i.e. if several embedding
+    models share the table.
+    """
+    current = column_type(engine)
+    if current == f"vector({dims})":
+        return False
+    if current != "vector":
+        raise ValueError(f"embedding column is {current}, expected vector or vector({dims})")
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN embedding TYPE vector({dims})"))
+    return True
+
+
+def default_lists(engine):
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar_one()
+    if rows <= 1_000_000:
+        return max(10, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def drop_index(engine, name=INDEX_NAME):
+    with _autocommit(engine) as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def build_index(engine, collection_name, method="hnsw", m=16, ef_construction=64, lists=None):
+    """(Re)build the ANN index over the embedding column.
+
+    PGVector filters by collection inside the same query, so one index on
+    the column serves every collection; collection_name is used to find
+    the embedding dimension. Cosine ops match PGVector's default distance.
+
+    The new index is built under a temporary name and swapped in by
+    renaming, so searches keep the old index until the new one is ready
+    and a failed build leaves the old index in place. The column must
+    already be vector(n); see ensure_fixed_dimensions.
+    """
+    if method not in ("hnsw", "ivfflat"):
+        raise ValueError("method must be 'hnsw' or 'ivfflat'")
+
+    dims = vector_dimensions(engine, collection_name)
+    current = column_type(engine)
+    if current != f"vector({dims})":
+        raise ValueError(
+            f"embedding column is {current}, the index needs vector({dims}); "
+            "run 'python ann_index.py fix-dimensions' first (it locks the table while it runs)"
+        )
+
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        options = f"lists = {int(lists or default_lists(engine))}"
+
+    # leftovers of an interrupted rebuild; a failed CONCURRENTLY build
+    # leaves an INVALID index behind
+    drop_index(engine, BUILD_INDEX_NAME)
+    drop_index(engine, OLD_INDEX_NAME)
+    start = time.monotonic()
+    try:
+        with _autocommit(engine) as conn:
+            conn.execute(text(f"""
+                CREATE INDEX CONCURRENTLY {BUILD_INDEX_NAME}
+                ON {TABLE}
+                USING {method} (embedding vector_cosine_ops)
+                WITH ({options})
+            """))
+    except Exception:
+        drop_index(engine, BUILD_INDEX_NAME)
+        raise
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER INDEX IF EXISTS {INDEX_NAME} RENAME TO {OLD_INDEX_NAME}"))
+        conn.execute(text(f"ALTER INDEX {BUILD_INDEX_NAME} RENAME TO {INDEX_NAME}"))
+    drop_index(engine, OLD_INDEX_NAME)
+    return {
+        "index": INDEX_NAME,
+        "method": method,
+        "dims": dims,
+        "options": options,
+        "build_seconds": round(time.monotonic() - start, 2),
+    }
+
+
+def index_status(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT indexname, indexdef,
+                   pg_size_pretty(pg_relation_size(indexname::regclass))
+            FROM pg_indexes
+            WHERE tablename = :table
+        """), {"table": TABLE}).all()
+    return [{"name": r[0], "definition": r[1], "size": r[2]} for r in rows]
+
+
+# the query is a stored chunk; leave it out or it is always its own top-1
+SEARCH_SQL = f"""
+    SELECT id FROM {TABLE}
+    WHERE collection_id = :cid AND id <> :qid
+    ORDER BY embedding <=> CAST(:q AS vector)
+    LIMIT :k
+"""
+
+
+def _search(conn, cid, query_id, vector, k):
+    params = {"cid": cid, "qid": query_id, "q": vector, "k": k}
+    return [row[0] for row in conn.execute(text(SEARCH_SQL), params).all()]
+
+
+def _uses_index(conn, cid, query_id, vector, k):
+    params = {"cid": cid, "qid": query_id, "q": vector, "k": k}
+    plan = conn.execute(text("EXPLAIN " + SEARCH_SQL), params).scalars().all()
+    return any(INDEX_NAME in line for line in plan)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def benchmark(engine, collection_name, k=4, num_queries=50, ef_search=(40,), probes=(10,)):
+    """Compare ANN results with exact search on the ingested data.
+
+    Stored chunk embeddings are used as queries, so no embedding calls
+    are made; each query's own row is excluded from its results. Exact
+    results come from a sequential scan with index scans disabled, and
+    ANN runs disable sequential scans. Each run's plan is checked with
+    EXPLAIN; a variant whose plan does not use INDEX_NAME (no index, or
+    the setting belongs to the other method) reports uses_index False.
+    """
+    with engine.connect() as conn:
+        cid = collection_uuid(conn, collection_name)
+        queries = [
+            (row[0], row[1]) for row in conn.execute(text(f"""
+                SELECT id, embedding::text FROM {TABLE}
+                WHERE collection_id = :cid
+                ORDER BY random()
+                LIMIT :n
+            """), {"cid": cid, "n": num_queries}).all()
+        ]
+        # end the implicit transaction so each query below gets its own
+        # and SET LOCAL is scoped to it
+        conn.commit()
+
+        def run(settings):
+            results, latencies, uses_index = [], [], False
+            for query_id, q in queries:
+                with conn.begin():
+                    for statement in settings:
+                        conn.execute(text(statement))
+                    if not results:
+                        uses_index = _uses_index(conn, cid, query_id, q, k)
+                    start = time.perf_counter()
+                    results.append(_search(conn, cid, query_id, q, k))
+                    latencies.append(time.perf_counter() - start)
+            return results, latencies, uses_index
+
+        exact, exact_latency, _ = run([
+            "SET LOCAL enable_indexscan = off",
+            "SET LOCAL enable_bitmapscan = off",
+        ])
+        report = [{
+            "mode": "exact",
+            "uses_index": False,
+            "recall_at_k": 1.0,
+            "p50_ms": round(_percentile(exact_latency, 50) * 1000, 2),
+            "p95_ms": round(_percentile(exact_latency, 95) * 1000, 2),
+        }]
+
+        variants = [("hnsw.ef_search", v) for v in ef_search] + [("ivfflat.probes", v) for v in probes]
+        for setting, value in variants:
+            approx, latency, uses_index = run([
+                "SET LOCAL enable_seqscan = off",
+                f"SET LOCAL {setting} = {int(value)}",
+            ])
+            if not uses_index:
+                print(f"{setting}={value}: the plan does not use {INDEX_NAME}, results are not ANN")
+            hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+            expected = sum(len(e) for e in exact)
+            report.append({
+                "mode": f"{setting}={value}",
+                "uses_index": uses_index,
+                "recall_at_k": round(hits / expected, 4) if expected else 0.0,
+                "p50_ms": round(_percentile(latency, 50) * 1000, 2),
+                "p95_ms": round(_percentile(latency, 95) * 1000, 2),
+            })
+
+    return report
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage the pgvector ANN index")
+    parser.add_argument("--collection", default="sql_docs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build or rebuild the index")
+    build.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    build.add_argument("--m", type=int, default=16)
+    build.add_argument("--ef-construction", type=int, default=64)
+    build.add_argument("--lists", type=int, default=None)
+
+    sub.add_parser(
+        "fix-dimensions",
+        help="type the embedding column as vector(n); locks and rewrites the table"
+    )
+    sub.add_parser("drop", help="drop the index")
+    sub.add_parser("status", help="list indexes on the embedding table")
+
+    bench = sub.add_parser("benchmark", help="recall@k and latency against exact search")
+    bench.add_argument("--k", type=int, default=4)
+    bench.add_argument("--queries", type=int, default=50)
+    bench.add_argument("--ef-search", type=_int_list, default=[20, 40, 100])
+    bench.add_argument("--probes", type=_int_list, default=[])
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    engine = get_registry().get_engine()
+
+    if args.command == "build":
+        print(build_index(
+            engine, args.collection, method=args.method, m=args.m,
+            ef_construction=args.ef_construction, lists=args.lists
+        ))
+    elif args.command == "fix-dimensions":
+        dims = vector_dimensions(engine, args.collection)
+        if ensure_fixed_dimensions(engine, dims):
+            print(f"embedding column is now vector({dims})")
+        else:
+            print(f"embedding column is already vector({dims})")
+    elif args.command == "drop":
+        drop_index(engine)
+        print(f"Dropped {INDEX_NAME}")
+    elif args.command == "status":
+        for index in index_status(engine):
+            print(f"{index['name']} ({index['size']}): {index['definition']}")
+    elif args.command == "benchmark":
+        for row in benchmark(
+            engine, args.collection, k=args.k, num_queries=args.queries,
+            ef_search=args.ef_search, probes=args.probes
+        ):
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
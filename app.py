@@ -1,8 +1,10 @@
 import streamlit as st
 import uuid
 
-from rag import answer_question, log_feedback
-from feedback_store import store_feedback_example
+from rag import answer_question_stream, log_feedback
+from feedback_sink import get_feedback_sink
+from rate_limit import LMRateLimitExceeded
+from tenants import TenantQuotaExceeded
 
 POSITIVE_REASONS = [
     "Correct and accurate",
@@ -53,13 +55,26 @@ def main():
     question = st.text_input("Enter your question")
 
     if st.button("Ask") and question.strip():
-        with st.spinner("Thinking..."):
-            answer, sources, trace_id, context = answer_question(
+        st.subheader("Answer")
+
+        try:
+            result = answer_question_stream(
                 question=question.strip(),
                 k=4,
                 user_id=st.session_state.user_id,
                 session_id=st.session_state.session_id,
             )
+            # tokens are rendered as they arrive; sources and the trace id are
+            # available on result once the stream is exhausted
+            st.write_stream(result)
+        except (TenantQuotaExceeded, LMRateLimitExceeded) as e:
+            st.warning(f"Too many requests right now, please try again in {e.retry_after:.0f} seconds.")
+            st.stop()
+
+        answer = result.answer
+        sources = result.sources
+        trace_id = result.trace_id
+        context = result.context
 
         st.session_state.last_trace_id = trace_id
         st.session_state.last_question = question
@@ -68,7 +83,7 @@ def main():
         st.session_state.show_feedback_form = False
         st.session_state.feedback_score = None
 
-        store_feedback_example(
+        get_feedback_sink().submit(
             trace_id=trace_id,
             question=question.strip(),
             context=context,
@@ -78,9 +93,6 @@ def main():
             comment=None,
         )
 
-        st.subheader("Answer")
-        st.write(answer)
-
         is_unknown = ("I do not know the answer" in answer or "No relevant context found" in answer or "I can’t generate jokes or poems" in answer)
 
         if not is_unknown and sources:
@@ -131,7 +143,7 @@ def main():
 
             log_feedback(st.session_state.last_trace_id, score)
 
-            store_feedback_example(
+            get_feedback_sink().submit(
                 trace_id=st.session_state.last_trace_id,
                 question=st.session_state.last_question,
                 context=st.session_state.last_context,
@@ -0,0 +1,119 @@
+import asyncio
+
+
+class AsyncRAGPipeline:
+    """Async retrieve-then-generate with a bound on in-flight questions.
+
+    The embedding call, the pgvector query and the LM call are all
+    awaited, so one event loop can serve many questions at once. The
+    semaphore caps how many run concurrently so a burst cannot exhaust
+    the database pool or the LM quota.
+
+    hybrid_search(question, query_embedding, k, filters), when given,
+    replaces the pgvector-only search; it is blocking (HybridRetriever)
+    and runs in a worker thread.
+    """
+
+    def __init__(self, program, embeddings, vectorstore, max_concurrency=32, cache=None,
+                 context_assembler=None, reranker=None, retrieval_depth=None,
+                 parent_expander=None, filtered_search=None, hybrid_search=None):
+        self.program = program
+        self.context_assembler = context_assembler
+        self.reranker = reranker
+        self.retrieval_depth = retrieval_depth
+        self.parent_expander = parent_expander
+        self.filtered_search = filtered_search
+        self.hybrid_search = hybrid_search
+        # cache entries are only reused for the same k and retrieval mode
+        self.retrieval_mode = "hybrid" if hybrid_search is not None else "dense"
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self._semaphores = {}
+
+    def _semaphore(self):
+        # asyncio primitives belong to one event loop; keep one per loop
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    async def answer(self, question, k=4, filters=None, use_cache=True):
+        """Return a dict with answer, docs, context, prediction and cache info.
+
+        Filtered questions need filtered_search unless hybrid_search is set.
+        """
+        async with self._semaphore():
+            query_embedding = await self.embeddings.aembed_query(question)
+
+            if self.cache is not None and use_cache:
+                cached, similarity = self.cache.lookup(
+                    query_embedding, k=k, mode=self.retrieval_mode
+                )
+                if cached is not None:
+                    return {
+                        "answer": cached["answer"],
+                        "sources": cached["sources"],
+                        "context": cached["context"],
+                        "docs": None,
+                        "prediction": None,
+                        "query_embedding": query_embedding,
+                        "cache_similarity": similarity,
+                    }
+
+            depth = self.retrieval_depth(k) if self.retrieval_depth else k
+            if self.hybrid_search is not None:
+                docs = await asyncio.to_thread(
+                    self.hybrid_search, question, query_embedding, depth, filters
+                )
+            elif filters:
+                docs = await self.filtered_search(query_embedding, depth, filters)
+            else:
+                docs = await self.vectorstore.asimilarity_search_by_vector(
+                    query_embedding, k=depth
+                )
+            if not docs:
+                return {
+                    "answer": None,
+                    "sources": [],
+                    "context": [],
+                    "docs": [],
+                    "prediction": None,
+                    "query_embedding": query_embedding,
+                    "cache_similarity": None,
+                }
+
+            # with parents, keep every candidate ranked and cut after expansion
+            top_n = len(docs) if self.parent_expander is not None else k
+            rerank_stats = {}
+            if self.reranker is not None:
+                # CPU-bound scoring stays off the event loop
+                docs, rerank_stats = await asyncio.to_thread(
+                    self.reranker, question, docs, top_n
+                )
+            if self.parent_expander is not None:
+                docs = await asyncio.to_thread(self.parent_expander, docs, k)
+
+            if self.context_assembler is not None:
+                docs, context_list, context_stats = self.context_assembler(docs)
+            else:
+                context_list = [d.page_content for d in docs]
+                context_stats = {}
+            context_stats.update(rerank_stats)
+
+            prediction = await self.program.acall(
+                context=context_list,
+                question=question
+            )
+
+            return {
+                "answer": prediction.answer,
+                "sources": None,
+                "context": context_list,
+                "docs": docs,
+                "context_stats": context_stats,
+                "prediction": prediction,
+                "query_embedding": query_embedding,
+                "cache_similarity": None,
+            }
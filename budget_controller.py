@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+import time
+
+from dspy.utils.callback import BaseCallback
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, limits):
+        super().__init__(f"Optimization budget exhausted: {', '.join(limits)}")
+        self.limits = limits
+
+
+_active = None
+
+
+def program_fingerprint(program):
+    """Hash of a program's instructions and demos.
+
+    Optimizers evaluate fresh copies of the same candidate, so identity
+    can't tell candidates apart; their state can.
+    """
+    state = json.dumps(program.dump_state(), sort_keys=True, default=str)
+    return hashlib.sha256(state.encode()).hexdigest()
+
+
+def active_budget():
+    """The controller of the running optimization, or None outside one."""
+    return _active
+
+
+class BudgetController(BaseCallback):
+    """Stops an optimizer run once its Budget is used up, keeping the best program.
+
+    The configured LM and the metric call check() before doing any work,
+    so once a limit is reached every further call fails at once and the
+    optimizer winds down without spending more. Usage comes from the shared
+    LMUsageMeter, so judge and proposal calls count as well.
+
+    Registered as a dspy callback, it notes which candidate program each
+    thread last ran; the metric's scores are credited to that candidate's
+    fingerprint. best() only considers candidates scored on at least
+    min_examples distinct examples (or on all devset_size of them), so one
+    lucky minibatch cannot win.
+    """
+
+    def __init__(self, budget, meter, program_type, devset_size, min_examples=5):
+        self.budget = budget
+        self.meter = meter
+        self.program_type = program_type
+        self.min_examples = min(min_examples, devset_size)
+        self.started = None
+        self.stopped_by = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._candidates = {}
+
+    def __enter__(self):
+        global _active
+        self.started = time.time()
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = None
+        return False
+
+    @property
+    def stopped(self):
+        return bool(self.stopped_by)
+
+    def elapsed(self):
+        return time.time() - self.started if self.started else 0.0
+
+    def check(self):
+        if not self.stopped_by:
+            limits = self.budget.exceeded(self.meter.snapshot(), self.elapsed())
+            if limits:
+                with self._lock:
+                    if not self.stopped_by:
+                        self.stopped_by = limits
+                        print(f"Budget reached ({', '.join(limits)}), stopping the optimizer")
+        if self.stopped_by:
+            raise BudgetExceeded(self.stopped_by)
+
+    def on_module_start(self, call_id, instance, inputs):
+        if type(instance) is self.program_type:
+            self._local.program = instance
+
+    def record(self, example, score):
+        program = getattr(self._local, "program", None)
+        if program is None or self.stopped:
+            return
+        fingerprint = program_fingerprint(program)
+        key = getattr(example, "question", None) or repr(example)
+        with self._lock:
+            if fingerprint not in self._candidates:
+                # the optimizer may keep mutating its copy after this call
+                self._candidates[fingerprint] = {"program": program.deepcopy(), "scores": {}}
+            self._candidates[fingerprint]["scores"][key] = float(score)
+
+    def wrap_metric(self, metric):
+        """Check the budget before each metric call and record its score.
+
+        GEPA's feedback calls (pred_name set) score a single predictor, not
+        a whole program, so they are not recorded.
+        """
+        def budgeted(gold, pred, trace=None, pred_name=None, pred_trace=None):
+            self.check()
+            result = metric(gold, pred, trace, pred_name, pred_trace)
+            if pred_name is None:
+                self.record(gold, getattr(result, "score", result))
+            return result
+        return budgeted
+
+    def best(self):
+        """(program, fingerprint, mean score, examples) of the best candidate.
+
+        Returns Nones when no candidate has been scored on enough examples.
+        """
+        with self._lock:
+            eligible = [
+                (fingerprint, c) for fingerprint, c in self._candidates.items()
+                if len(c["scores"]) >= self.min_examples
+            ]
+            if not eligible:
+                return None, None, None, 0
+            fingerprint, candidate = max(
+                eligible,
+                key=lambda e: (sum(e[1]["scores"].values()) / len(e[1]["scores"]), len(e[1]["scores"])),
+            )
+            scores = candidate["scores"]
+            return candidate["program"], fingerprint, round(sum(scores.values()) / len(scores), 4), len(scores)
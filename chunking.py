@@ -0,0 +1,235 @@
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# upper case only, like SQL_CLAUSE: prose such as "Create a table..." or
+# "Select the rows..." starts with the same words
+SQL_START = re.compile(
+    r"^\s*(?:(?:SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER|DROP|TRUNCATE|GRANT|REVOKE|MERGE)\b"
+    # WITH only opens a CTE ("WITH name AS (", "WITH RECURSIVE t(n) AS"),
+    # not prose such as "WITH THIS CLAUSE..."
+    r"|WITH\s+(?:RECURSIVE\s+)?\w+\s*(?:\([^)]*\))?\s+AS\b)"
+)
+# clauses that continue a statement; upper case only, since "From", "And"
+# or "On" at the start of a prose line are ordinary words
+SQL_CLAUSE = re.compile(
+    r"^\s*(?:FROM|WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|OFFSET|FETCH|WINDOW|"
+    r"UNION|INTERSECT|EXCEPT|VALUES|SET|RETURNING|ON|USING|AND|OR|CASE|WHEN|THEN|ELSE|END|"
+    r"(?:(?:NATURAL|INNER|CROSS|LEFT|RIGHT|FULL)\s+)?(?:OUTER\s+)?JOIN)\b"
+)
+# "Output: Name Salary", "Note: ..." label a line of body text
+LABEL = re.compile(r"^[^\W\d_]\w*:\s")
+WORD = re.compile(r"[^\W\d_]{2,}")
+NUMBERED_HEADING = re.compile(r"^\s*(\d+(?:\.\d+)*)[.)]?\s+[A-Za-z]")
+TABLE_ROW = re.compile(r"\S+(?:\s{2,}|\t|\s*\|\s*)\S+(?:(?:\s{2,}|\t|\s*\|\s*)\S+)+")
+
+HEADING_MAX_CHARS = 80
+# headings at this level or above close the current chunk
+SECTION_BREAK_LEVEL = 2
+
+
+def is_sql(line):
+    return bool(SQL_START.match(line) or SQL_CLAUSE.match(line))
+
+
+def heading_level(line):
+    """Return a heading level for line, or None if it reads like body text."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > HEADING_MAX_CHARS:
+        return None
+    if stripped.endswith((".", ",", ";", ":")) or is_sql(stripped):
+        return None
+    # page numbers ("21", "- 3 -") and labels are never headings
+    if not WORD.search(stripped) or LABEL.match(stripped):
+        return None
+
+    # ALL CAPS titles sit above numbered sections ("1.", "1.2", ...),
+    # and short Title Case lines are treated as the lowest level
+    letters = [c for c in stripped if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return 1
+
+    numbered = NUMBERED_HEADING.match(stripped)
+    if numbered:
+        return numbered.group(1).count(".") + 2
+
+    words = stripped.split()
+    if 1 <= len(words) <= 8 and all(w[0].isupper() or not w[0].isalpha() for w in words):
+        return 4
+    return None
+
+
+def continues_statement(previous, line):
+    """Whether line carries on the SQL statement ending in previous.
+
+    Anything inside an open list ("(" or ","), such as the columns of a
+    CREATE TABLE, does. Otherwise only clause lines and indented lines do,
+    and a heading never does.
+    """
+    if not line.strip():
+        return False
+    if previous.rstrip().endswith((",", "(")) or line.lstrip().startswith(")"):
+        return True
+    if heading_level(line) is not None:
+        return False
+    return is_sql(line) or line[:1].isspace()
+
+
+def classify_blocks(text):
+    """Split page text into (kind, text) blocks, plus a level for headings.
+
+    kind is heading, code, table or prose. SQL statements run until a
+    line ending in ';', a blank line, or a line that does not continue
+    the statement (see continues_statement), and a clause line (ORDER BY,
+    JOIN, ...) after an unterminated statement joins it even across a
+    blank line. Table blocks are runs of lines with three or more
+    aligned columns.
+    """
+    blocks = []
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        if is_sql(line):
+            statement = [line]
+            while (
+                not statement[-1].rstrip().endswith(";")
+                and i + 1 < len(lines)
+                and continues_statement(statement[-1], lines[i + 1])
+            ):
+                i += 1
+                statement.append(lines[i])
+            text = "\n".join(statement)
+            previous = blocks[-1] if blocks else None
+            if (
+                SQL_CLAUSE.match(line)
+                and previous is not None
+                and previous[0] == "code"
+                and not previous[1].rstrip().endswith(";")
+            ):
+                blocks[-1] = ("code", previous[1] + "\n" + text)
+            else:
+                blocks.append(("code", text))
+            i += 1
+            continue
+
+        if TABLE_ROW.fullmatch(line.strip()):
+            rows = [line]
+            while i + 1 < len(lines) and TABLE_ROW.fullmatch(lines[i + 1].strip()):
+                i += 1
+                rows.append(lines[i])
+            if len(rows) >= 2:
+                blocks.append(("table", "\n".join(rows)))
+                i += 1
+                continue
+
+        level = heading_level(line)
+        if level is not None:
+            blocks.append(("heading", line.strip(), level))
+            i += 1
+            continue
+
+        paragraph = [line]
+        while (
+            i + 1 < len(lines)
+            and lines[i + 1].strip()
+            and not is_sql(lines[i + 1])
+            and heading_level(lines[i + 1]) is None
+            and not TABLE_ROW.fullmatch(lines[i + 1].strip())
+        ):
+            i += 1
+            paragraph.append(lines[i])
+        blocks.append(("prose", " ".join(l.strip() for l in paragraph)))
+        i += 1
+    return blocks
+
+
+class StructureAwareSplitter:
+    """Chunks PDF pages along headings, SQL statements and tables.
+
+    Code and table blocks are never cut unless a single block is larger
+    than twice chunk_size. A title or numbered section starts a new chunk,
+    and every chunk records its heading path in metadata. Prose chunks
+    carry chunk_overlap characters of the previous prose forward.
+    Pages must be passed in order so headings carry across page breaks.
+    """
+
+    def __init__(self, chunk_size=800, chunk_overlap=100):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+
+    def _emit(self, chunks, parts, kinds, headings, metadata):
+        if not parts:
+            return
+        path = [h for _, h in headings]
+        chunks.append(Document(
+            page_content="\n\n".join(parts),
+            metadata={
+                **metadata,
+                "heading_path": " > ".join(path),
+                "section": path[-1] if path else "",
+                "block_types": ",".join(sorted(set(kinds))),
+            }
+        ))
+
+    def split_documents(self, pages):
+        chunks = []
+        headings = []
+
+        for page in pages:
+            parts, kinds, size = [], [], 0
+            tail = ""
+
+            for block in classify_blocks(page.page_content):
+                kind, body = block[0], block[1]
+
+                if kind == "heading":
+                    level = block[2]
+                    if level <= SECTION_BREAK_LEVEL and parts:
+                        self._emit(chunks, parts, kinds, headings, page.metadata)
+                        parts, kinds, size, tail = [], [], 0, ""
+                    headings = [(l, h) for l, h in headings if l < level] + [(level, body)]
+                    continue
+
+                if kind == "prose" and len(body) > self.chunk_size:
+                    pieces = self._fallback.split_text(body)
+                elif kind != "prose" and len(body) > 2 * self.chunk_size:
+                    pieces = self._fallback.split_text(body)
+                else:
+                    pieces = [body]
+
+                for piece in pieces:
+                    if parts and size + len(piece) > self.chunk_size:
+                        self._emit(chunks, parts, kinds, headings, page.metadata)
+                        parts, kinds, size = [], [], 0
+                        if tail and kind == "prose":
+                            parts, kinds, size = [tail], ["prose"], len(tail)
+                    parts.append(piece)
+                    kinds.append(kind)
+                    size += len(piece)
+                    if kind == "prose":
+                        tail = piece[-self.chunk_overlap:] if self.chunk_overlap else ""
+
+            self._emit(chunks, parts, kinds, headings, page.metadata)
+
+        return chunks
+
+
+SPLITTERS = ("recursive", "structure")
+
+
+def make_splitter(name, chunk_size, chunk_overlap):
+    if name == "recursive":
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if name == "structure":
+        return StructureAwareSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"Unknown splitter {name!r}, expected one of {SPLITTERS}")
@@ -0,0 +1,93 @@
+import argparse
+import math
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from chunking import SPLITTERS, make_splitter
+from rate_limit import estimate_tokens
+from reranking import tokenize
+from trainset import trainset
+from vector_store import get_registry
+
+
+def load_pages(path):
+    pages = []
+    for page in PyPDFLoader(path).lazy_load():
+        page.metadata["source"] = path
+        pages.append(page)
+    return pages
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def is_hit(chunks, gold_context, min_overlap):
+    """True if any chunk covers at least min_overlap of a gold passage's terms."""
+    for passage in gold_context:
+        terms = set(tokenize(passage))
+        if not terms:
+            continue
+        for chunk in chunks:
+            if len(terms & set(tokenize(chunk))) / len(terms) >= min_overlap:
+                return True
+    return False
+
+
+def evaluate(pages, embeddings, splitter, chunk_size, chunk_overlap, k, min_overlap):
+    chunks = [
+        c.page_content
+        for c in make_splitter(splitter, chunk_size, chunk_overlap).split_documents(pages)
+    ]
+    vectors = embeddings.embed_documents(chunks)
+
+    hits = 0
+    context_tokens = 0
+    for example in trainset:
+        query = embeddings.embed_query(example.question)
+        ranked = sorted(range(len(chunks)), key=lambda i: -cosine(query, vectors[i]))
+        top = [chunks[i] for i in ranked[:k]]
+        hits += is_hit(top, example.context, min_overlap)
+        context_tokens += sum(estimate_tokens(c) for c in top)
+
+    return {
+        "splitter": splitter,
+        "chunks": len(chunks),
+        "hit_rate": round(hits / len(trainset), 3),
+        "avg_context_tokens": round(context_tokens / len(trainset), 1),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare splitters by retrieval hit-rate and context size")
+    parser.add_argument("path", nargs="?", default="data/uploads/sql.pdf")
+    parser.add_argument("--splitters", default=",".join(SPLITTERS))
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--min-overlap", type=float, default=0.6,
+                        help="share of a gold passage's terms a chunk must contain to count as a hit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pages = load_pages(args.path)
+    embeddings = get_registry().get_embeddings()
+
+    print(f"{'splitter':<12}{'chunks':>8}{'hit_rate':>10}{'avg_ctx_tokens':>16}")
+    for splitter in args.splitters.split(","):
+        result = evaluate(
+            pages, embeddings, splitter, args.chunk_size, args.chunk_overlap,
+            args.k, args.min_overlap
+        )
+        print(
+            f"{result['splitter']:<12}{result['chunks']:>8}"
+            f"{result['hit_rate']:>10}{result['avg_context_tokens']:>16}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,3 +14,196 @@ def get_gemini_api_key():
     if not api_key:
         raise ValueError("GEMINI_API_KEY ERROR")
     return api_key
+
+def get_int_env(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+def get_float_env(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+def get_vector_pool_settings():
+    return {
+        "pool_size": get_int_env("VECTOR_POOL_SIZE", 5),
+        "max_overflow": get_int_env("VECTOR_POOL_MAX_OVERFLOW", 10),
+        "pool_timeout": get_float_env("VECTOR_POOL_TIMEOUT", 30.0),
+        "pool_recycle": get_int_env("VECTOR_POOL_RECYCLE", 1800),
+    }
+
+def get_feedback_pool_settings():
+    return {
+        "min_size": get_int_env("FEEDBACK_POOL_MIN_SIZE", 1),
+        "max_size": get_int_env("FEEDBACK_POOL_MAX_SIZE", 10),
+        "acquire_timeout": get_float_env("FEEDBACK_POOL_ACQUIRE_TIMEOUT", 5.0),
+    }
+
+def get_feedback_sink_settings():
+    return {
+        "max_queue_size": get_int_env("FEEDBACK_SINK_MAX_QUEUE", 1000),
+        "batch_size": get_int_env("FEEDBACK_SINK_BATCH_SIZE", 50),
+        "flush_interval": get_float_env("FEEDBACK_SINK_FLUSH_INTERVAL", 2.0),
+        "put_timeout": get_float_env("FEEDBACK_SINK_PUT_TIMEOUT", 0.05),
+    }
+
+def get_semantic_cache_settings():
+    return {
+        "enabled": os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true",
+        "threshold": get_float_env("SEMANTIC_CACHE_THRESHOLD", 0.95),
+        "max_entries": get_int_env("SEMANTIC_CACHE_MAX_ENTRIES", 512),
+        "ttl_seconds": get_float_env("SEMANTIC_CACHE_TTL", 3600.0),
+        "version_check_interval": get_float_env("SEMANTIC_CACHE_VERSION_CHECK", 60.0),
+    }
+
+def get_embedding_cache_settings():
+    return {
+        "max_entries": get_int_env("EMBEDDING_CACHE_MAX_ENTRIES", 10000),
+        "path": os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3"),
+        "disk_max_entries": get_int_env("EMBEDDING_CACHE_DISK_MAX_ENTRIES", 200000),
+    }
+
+def get_judge_cache_settings():
+    return {
+        "max_entries": get_int_env("JUDGE_CACHE_MAX_ENTRIES", 50000),
+        "path": os.getenv("JUDGE_CACHE_PATH", ".cache/judge.sqlite3"),
+    }
+
+def get_ingestion_settings():
+    return {
+        "batch_size": get_int_env("EMBED_BATCH_SIZE", 64),
+        "max_workers": get_int_env("EMBED_MAX_WORKERS", 4),
+        "requests_per_minute": get_int_env("EMBED_REQUESTS_PER_MINUTE", 1500),
+        "tokens_per_minute": get_int_env("EMBED_TOKENS_PER_MINUTE", 1000000),
+        "max_retries": get_int_env("EMBED_MAX_RETRIES", 5),
+        "backoff_seconds": get_float_env("EMBED_BACKOFF_SECONDS", 1.0),
+    }
+
+def get_lm_rate_settings(profile="serving"):
+    """Limiter settings for "serving" (the app) or "optimization" runs.
+
+    Serving is unlimited by default and never waits long inside a user
+    request; optimization keeps the free-tier Gemini limits and waits.
+    A limit or max wait of 0 disables it.
+    """
+    if profile == "optimization":
+        return {
+            "requests_per_minute": get_int_env("LM_REQUESTS_PER_MINUTE", 10),
+            "tokens_per_minute": get_int_env("LM_TOKENS_PER_MINUTE", 250000),
+            "max_retries": get_int_env("LM_MAX_RETRIES", 5),
+            "backoff_seconds": get_float_env("LM_BACKOFF_SECONDS", 2.0),
+            "max_wait_seconds": get_float_env("LM_MAX_WAIT_SECONDS", 0) or None,
+        }
+    return {
+        "requests_per_minute": get_int_env("SERVING_LM_REQUESTS_PER_MINUTE", 0),
+        "tokens_per_minute": get_int_env("SERVING_LM_TOKENS_PER_MINUTE", 0),
+        "max_retries": get_int_env("SERVING_LM_MAX_RETRIES", 2),
+        "backoff_seconds": get_float_env("SERVING_LM_BACKOFF_SECONDS", 1.0),
+        "max_wait_seconds": get_float_env("SERVING_LM_MAX_WAIT_SECONDS", 10.0) or None,
+    }
+
+def get_async_settings():
+    return {
+        "max_concurrency": get_int_env("RAG_MAX_CONCURRENCY", 32),
+    }
+
+DIAGNOSTICS_DEFAULTS = {
+    "development": {"log_level": "DEBUG", "prompt_dump_rate": 1.0},
+    "staging": {"log_level": "INFO", "prompt_dump_rate": 0.1},
+    "production": {"log_level": "INFO", "prompt_dump_rate": 0.01},
+}
+
+def get_diagnostics_settings():
+    env = os.getenv("APP_ENV", "production").lower()
+    defaults = DIAGNOSTICS_DEFAULTS.get(env, DIAGNOSTICS_DEFAULTS["production"])
+    return {
+        "env": env,
+        "log_level": os.getenv("RAG_LOG_LEVEL", defaults["log_level"]).upper(),
+        "prompt_dump_rate": get_float_env("RAG_PROMPT_DUMP_RATE", defaults["prompt_dump_rate"]),
+    }
+
+def get_retrieval_mode():
+    mode = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+    if mode not in ("hybrid", "dense"):
+        raise ValueError("RAG_RETRIEVAL_MODE must be 'hybrid' or 'dense'")
+    return mode
+
+def get_ann_search_settings():
+    return {
+        "hnsw_ef_search": get_int_env("ANN_HNSW_EF_SEARCH", 40),
+        "ivfflat_probes": get_int_env("ANN_IVFFLAT_PROBES", 10),
+        "iterative_scan": os.getenv("ANN_ITERATIVE_SCAN", "relaxed_order"),
+    }
+
+def get_context_settings():
+    return {
+        "token_budget": get_int_env("RAG_CONTEXT_TOKEN_BUDGET", 2000),
+        "duplicate_threshold": get_float_env("RAG_CONTEXT_DUPLICATE_THRESHOLD", 0.9),
+        "min_overlap_chars": get_int_env("RAG_CONTEXT_MIN_OVERLAP", 20),
+    }
+
+def get_rerank_settings():
+    return {
+        "reranker": os.getenv("RAG_RERANKER", "lexical").lower(),
+        "fetch_k": get_int_env("RAG_RERANK_FETCH_K", 20),
+        "budget_ms": get_float_env("RAG_RERANK_BUDGET_MS", 150.0),
+        "model": os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        "backend": os.getenv("RAG_RERANK_BACKEND", "torch"),
+        "batch_size": get_int_env("RAG_RERANK_BATCH_SIZE", 32),
+    }
+
+def get_chunking_config(collection_name):
+    """Splitter settings for a collection.
+
+    CHUNKING_CONFIG_PATH (default chunking.json) may map collection names
+    to {"splitter", "chunk_size", "chunk_overlap"}; a "default" entry
+    applies to collections that are not listed.
+    """
+    settings = {"splitter": "recursive", "chunk_size": 800, "chunk_overlap": 100}
+    path = os.getenv("CHUNKING_CONFIG_PATH", "chunking.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            configured = json.load(f)
+        settings.update(configured.get("default", {}))
+        settings.update(configured.get(collection_name, {}))
+    return settings
+
+def get_tenant_settings():
+    return {
+        "config_path": os.getenv("TENANTS_CONFIG_PATH", "tenants.json"),
+        "max_active_tenants": get_int_env("TENANT_MAX_ACTIVE", 16),
+        "cache_total_entries": get_int_env("TENANT_CACHE_TOTAL_ENTRIES", 2048),
+        "requests_per_minute": get_int_env("TENANT_REQUESTS_PER_MINUTE", 60),
+        "tokens_per_minute": get_int_env("TENANT_TOKENS_PER_MINUTE", 200000),
+    }
+
+def get_optimizer_settings():
+    return {
+        "num_threads": get_int_env("OPTIMIZER_NUM_THREADS", 4),
+        "config_path": os.getenv("OPTIMIZER_CONFIG_PATH", "optimizers.json"),
+        "report_dir": os.getenv("OPTIMIZER_REPORT_DIR", "reports"),
+        "min_best_examples": get_int_env("OPTIMIZER_MIN_BEST_EXAMPLES", 5),
+    }
+
+def get_optimizer_config():
+    """Optional optimizer overrides and budget from OPTIMIZER_CONFIG_PATH.
+
+    {"budget": {"max_lm_calls", "max_tokens", "max_seconds"},
+     "optimizers": {name: {"init": {...}, "compile": {...},
+                           "train_size": ..., "eval_size": ...}}}
+    """
+    path = get_optimizer_settings()["config_path"]
+    config = {"budget": {}, "optimizers": {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    return config
@@ -0,0 +1 @@
+# keeps the repository root on sys.path for tests/
@@ -0,0 +1,122 @@
+from langchain_core.documents import Document
+
+from config import get_context_settings
+from rate_limit import estimate_tokens
+
+MAX_OVERLAP_CHARS = 400
+
+
+def overlap_length(left, right, min_overlap):
+    """Length of the longest suffix of left that is a prefix of right."""
+    limit = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(limit, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def shingles(text, size=5):
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def containment(a, b):
+    """Share of the smaller shingle set that also appears in the other.
+
+    Unlike Jaccard this stays at 1.0 when a chunk is wholly contained in a
+    larger merged chunk.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def page_key(doc):
+    return (doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def merge_neighbours(docs, min_overlap):
+    """Merge chunks from the same page whose text overlaps.
+
+    The splitter's chunk_overlap repeats text at chunk boundaries; joining
+    overlapping neighbours keeps that text once. The merged chunk takes
+    the position of its best-ranked part.
+    """
+    merged = []
+    for doc in docs:
+        text = doc.page_content
+        for i, existing in enumerate(merged):
+            if page_key(existing) != page_key(doc):
+                continue
+            current = existing.page_content
+            if text in current:
+                text = None
+                break
+            if current in text:
+                merged[i] = Document(page_content=text, metadata=existing.metadata)
+                text = None
+                break
+            forward = overlap_length(current, text, min_overlap)
+            if forward:
+                merged[i] = Document(page_content=current + text[forward:], metadata=existing.metadata)
+                text = None
+                break
+            backward = overlap_length(text, current, min_overlap)
+            if backward:
+                merged[i] = Document(page_content=text + current[backward:], metadata=existing.metadata)
+                text = None
+                break
+        if text is not None:
+            merged.append(doc)
+    return merged
+
+
+def assemble_context(docs, token_budget=None, duplicate_threshold=None, min_overlap=None):
+    """Turn retrieved documents into a deduplicated, budgeted context.
+
+    docs must be in relevance order. Overlapping neighbours are merged,
+    near-duplicates (shingle containment >= duplicate_threshold) are dropped,
+    and documents are packed in order until token_budget is reached.
+    Returns (kept_docs, context_list, stats).
+    """
+    settings = get_context_settings()
+    token_budget = token_budget if token_budget is not None else settings["token_budget"]
+    duplicate_threshold = duplicate_threshold if duplicate_threshold is not None else settings["duplicate_threshold"]
+    min_overlap = min_overlap if min_overlap is not None else settings["min_overlap_chars"]
+
+    tokens_before = sum(estimate_tokens(d.page_content) for d in docs)
+
+    unique = []
+    seen = []
+    for doc in merge_neighbours(docs, min_overlap):
+        doc_shingles = shingles(doc.page_content)
+        for i, earlier in enumerate(seen):
+            if containment(doc_shingles, earlier) >= duplicate_threshold:
+                # keep the larger text at the better-ranked position
+                if len(doc_shingles) > len(earlier):
+                    seen[i] = doc_shingles
+                    unique[i] = doc
+                break
+        else:
+            seen.append(doc_shingles)
+            unique.append(doc)
+
+    kept = []
+    used = 0
+    for doc in unique:
+        tokens = estimate_tokens(doc.page_content)
+        # a smaller, less relevant chunk may still fit after a large one is skipped
+        if kept and used + tokens > token_budget:
+            continue
+        kept.append(doc)
+        used += tokens
+
+    return kept, [d.page_content for d in kept], {
+        "context_docs_retrieved": len(docs),
+        "context_docs_used": len(kept),
+        "context_tokens_before": tokens_before,
+        "context_tokens": used,
+        "context_tokens_saved": tokens_before - used,
+    }
@@ -0,0 +1,134 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+
+from dspy.utils.callback import BaseCallback
+
+from config import get_diagnostics_settings
+
+_setup_lock = threading.Lock()
+_listener = None
+_settings = None
+
+
+def setup_diagnostics():
+    """Route the rag.* loggers through a queue drained by a background thread.
+
+    Request threads only enqueue log records, so a slow stdout never
+    blocks answering a question. Safe to call more than once.
+    """
+    global _listener, _settings
+    with _setup_lock:
+        if _listener is not None:
+            return _settings
+
+        _settings = get_diagnostics_settings()
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s %(message)s"
+        ))
+
+        log_queue = queue.Queue(-1)
+        _listener = logging.handlers.QueueListener(log_queue, handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger = logging.getLogger("rag")
+        logger.setLevel(_settings["log_level"])
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.propagate = False
+
+        return _settings
+
+
+def get_logger(name="rag"):
+    setup_diagnostics()
+    return logging.getLogger(name)
+
+
+def log_event(event, **fields):
+    logger = get_logger("rag.events")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def should_dump_prompt():
+    # dumps are logged at DEBUG; don't capture what would be dropped
+    settings = setup_diagnostics()
+    if not get_logger("rag.prompts").isEnabledFor(logging.DEBUG):
+        return False
+    return random.random() < settings["prompt_dump_rate"]
+
+
+# LM calls of the current request when it was sampled for a prompt dump,
+# else None. A list rather than a value so that threads dspy starts with
+# a copy of this context append to the same request's record.
+_request_lm_calls = contextvars.ContextVar("rag_request_lm_calls", default=None)
+
+
+class PromptCapture(BaseCallback):
+    """Records the prompt and outputs of LM calls made by sampled requests.
+
+    lm.history is shared by every thread and task, so its last entry may
+    belong to another request; this keeps each request's calls apart.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def on_lm_start(self, call_id, instance, inputs):
+        calls = _request_lm_calls.get()
+        if calls is None:
+            return
+        entry = {
+            "model": getattr(instance, "model", None),
+            "messages": inputs.get("messages") or inputs.get("prompt"),
+        }
+        calls.append(entry)
+        self._pending[call_id] = entry
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        entry = self._pending.pop(call_id, None)
+        if entry is not None:
+            entry["outputs"] = outputs
+            entry["error"] = str(exception) if exception is not None else None
+
+
+def install_prompt_capture(lm):
+    """Attach a PromptCapture to lm; copies of the LM inherit it."""
+    if not any(isinstance(c, PromptCapture) for c in lm.callbacks):
+        lm.callbacks.append(PromptCapture())
+
+
+def start_prompt_capture():
+    """Sample the current request and, if chosen, record its LM calls."""
+    _request_lm_calls.set([] if should_dump_prompt() else None)
+
+
+def dump_last_prompt(trace_id=None):
+    """Log this request's last LM prompt and response if it was sampled.
+
+    Replaces an unconditional dspy.inspect_history call; nothing is
+    recorded or formatted for requests that were not sampled.
+    """
+    calls = _request_lm_calls.get()
+    _request_lm_calls.set(None)
+    if not calls:
+        return False
+
+    entry = calls[-1]
+    get_logger("rag.prompts").debug(json.dumps({
+        "trace_id": trace_id,
+        "model": entry.get("model"),
+        "messages": entry.get("messages"),
+        "outputs": entry.get("outputs"),
+        "error": entry.get("error"),
+    }, default=str))
+    return True
@@ -1,51 +1,129 @@
 import dspy
 import os
+import threading
 from config import get_gemini_api_key
-def configure_lm():
-    api_key=get_gemini_api_key()
-    lm=dspy.LM(
-        model="gemini/gemini-2.5-flash",
-        api_key=api_key,
-        temperature=0.1,
-        track_usage=True,
-    )
-    dspy.configure(lm=lm)
-# import dspy
-# import time
-# from config import get_gemini_api_key
+from rate_limit import get_lm_limiter, estimate_tokens
+from budget_controller import active_budget
+
+
+def prompt_tokens(prompt=None, messages=None):
+    if messages:
+        text = "".join(str(m.get("content") or "") for m in messages)
+    else:
+        text = prompt or ""
+    return estimate_tokens(text)
+
+
+def response_usage(response):
+    usage = getattr(response, "usage", None) or {}
+    return {
+        key: (usage.get(key) if isinstance(usage, dict) else getattr(usage, key, 0)) or 0
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
+
+
+def response_tokens(response):
+    return response_usage(response)["total_tokens"]
+
 
+class LMUsageMeter:
+    """Thread-safe count of LM calls and tokens since the last reset.
 
-# class RateLimitedLM(dspy.LM):
-#     def __init__(self, base_lm, delay_seconds=15):
-#         self.base_lm = base_lm
-#         self.delay_seconds = delay_seconds
+    Unlike per-prediction usage this sees every call made through the
+    configured LM, including judge, proposal and reflection calls.
+    """
 
-#     def __call__(self, *args, **kwargs):
-#         time.sleep(self.delay_seconds)
-#         return self.base_lm(*args, **kwargs)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
 
-#     def copy(self, **kwargs):
-#         # MIPRO NEEDS THIS
-#         copied_base = self.base_lm.copy(**kwargs)
-#         return RateLimitedLM(copied_base, self.delay_seconds)
+    def reset(self):
+        with self._lock:
+            self._totals = {
+                "lm_calls": 0,
+                "lm_cached_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+            }
 
-#     def __getattr__(self, name):
-#         # Forward everything else to base LM
-#         return getattr(self.base_lm, name)
+    def record(self, response):
+        usage = response_usage(response)
+        with self._lock:
+            # cache hits cost nothing, so they stay out of calls and tokens
+            if getattr(response, "cache_hit", False):
+                self._totals["lm_cached_calls"] += 1
+                return
+            self._totals["lm_calls"] += 1
+            for key, value in usage.items():
+                self._totals[key] += value
 
+    def snapshot(self):
+        with self._lock:
+            return dict(self._totals)
 
-# def configure_lm():
-#     api_key = get_gemini_api_key()
 
-#     base_lm = dspy.LM(
-#         model="gemini/gemini-2.5-flash",
-#         api_key=api_key,
-#         temperature=0.1,
-#         track_usage=True,
-#     )
+lm_meter = LMUsageMeter()
 
-#     # Wrap with rate limiter
-#     rate_limited_lm = RateLimitedLM(base_lm, delay_seconds=15)
 
-#     dspy.configure(lm=rate_limited_lm)
+class RateLimitedLM(dspy.LM):
+    """dspy.LM whose calls go through a process-wide adaptive limiter.
 
+    rate_profile picks the limiter: "serving" for the app, "optimization"
+    for optimizer runs. The limiter is looked up per call rather than
+    stored on the LM, so copies made by the optimizers share one budget.
+    Provider retries are turned off because the limiter already retries
+    429s with backoff. Responses served from dspy's cache give their
+    reservation back. During an optimizer run each call first checks the
+    run's budget.
+    """
+
+    def __init__(self, *args, rate_profile="serving", **kwargs):
+        kwargs.setdefault("num_retries", 0)
+        super().__init__(*args, **kwargs)
+        self.rate_profile = rate_profile
+
+    def _settle(self, limiter, estimate, response):
+        if getattr(response, "cache_hit", False):
+            limiter.refund(estimate)
+        else:
+            limiter.charge(response_tokens(response) - estimate)
+        lm_meter.record(response)
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        budget = active_budget()
+        if budget is not None:
+            budget.check()
+        limiter = get_lm_limiter(self.rate_profile)
+        estimate = prompt_tokens(prompt, messages)
+        response = limiter.call(
+            lambda: super(RateLimitedLM, self).forward(prompt=prompt, messages=messages, **kwargs),
+            tokens=estimate
+        )
+        self._settle(limiter, estimate, response)
+        return response
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        budget = active_budget()
+        if budget is not None:
+            budget.check()
+        limiter = get_lm_limiter(self.rate_profile)
+        estimate = prompt_tokens(prompt, messages)
+        response = await limiter.acall(
+            lambda: super(RateLimitedLM, self).aforward(prompt=prompt, messages=messages, **kwargs),
+            tokens=estimate
+        )
+        self._settle(limiter, estimate, response)
+        return response
+
+
+def configure_lm(rate_profile="serving"):
+    api_key=get_gemini_api_key()
+    lm=RateLimitedLM(
+        model="gemini/gemini-2.5-flash",
+        api_key=api_key,
+        temperature=0.1,
+        track_usage=True,
+        rate_profile=rate_profile,
+    )
+    dspy.configure(lm=lm)
@@ -19,4 +19,7 @@ class RAGModule(dspy.Module):
 
     def forward(self, context, question):
         return self.generate(context=context, question=question)
+
+    async def aforward(self, context, question):
+        return await self.generate.acall(context=context, question=question)
 rag_module = RAGModule()
@@ -0,0 +1,265 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from config import get_embedding_cache_settings
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+class SQLiteEmbeddingStore:
+    """On-disk embedding store so a restarted process starts warm.
+
+    Past max_entries the least recently used tenth is deleted, so new
+    questions cannot grow the file without bound.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if "last_used" not in columns:
+            # stores written before eviction existed
+            self._conn.execute(
+                "ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0"
+            )
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS embeddings_last_used_idx
+            ON embeddings (last_used)
+        """)
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._evictions = 0
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            # existing keys only have their vector and last_used refreshed
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, array("f", vector).tobytes(), now)
+                    for key, vector in items
+                ]
+            )
+            self._entries += self._conn.total_changes - before
+            self._conn.executemany(
+                "UPDATE embeddings SET vector = ?, last_used = ? WHERE key = ?",
+                [
+                    (array("f", vector).tobytes(), now, key)
+                    for key, vector in items
+                ]
+            )
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # drop a batch at once so eviction does not run on every insert
+        target = int(self.max_entries * 0.9)
+        deleted = self._conn.execute("""
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+            )
+        """, (self._entries - target,)).rowcount
+        self._entries -= deleted
+        self._evictions += deleted
+
+    def stats(self):
+        with self._lock:
+            return {"entries": self._entries, "evictions": self._evictions}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that never embeds the same text twice.
+
+    Lookups go to an in-memory LRU first, then to the optional SQLite
+    store, and only the remaining texts are sent to the wrapped model in
+    one call. Query and document embeddings are cached separately
+    because Gemini embeds them with different task types.
+    """
+
+    def __init__(self, underlying, model_name, max_entries=10000, store=None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.store = store
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _key(self, kind, text):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _cached(self, keys):
+        results = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[key] = self._memory[key]
+            self._stats["memory_hits"] += len(results)
+
+        missing = [k for k in dict.fromkeys(keys) if k not in results]
+        if missing and self.store is not None:
+            from_disk = self.store.get_many(missing)
+            for key, vector in from_disk.items():
+                results[key] = vector
+                self._remember(key, vector)
+            with self._lock:
+                self._stats["disk_hits"] += len(from_disk)
+
+        return results
+
+    def _missing(self, keys, texts, results):
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in to_embed:
+                to_embed[key] = text
+        return to_embed
+
+    def _save(self, results, keys, vectors):
+        fresh = list(zip(keys, vectors))
+        for key, vector in fresh:
+            results[key] = vector
+            self._remember(key, vector)
+        if self.store is not None:
+            self.store.put_many(fresh)
+        with self._lock:
+            self._stats["misses"] += len(fresh)
+
+    def _embed(self, kind, texts, embed_fn):
+        keys = [self._key(kind, t) for t in texts]
+        results = self._cached(keys)
+        to_embed = self._missing(keys, texts, results)
+        if to_embed:
+            self._save(results, list(to_embed), embed_fn(list(to_embed.values())))
+        return [results[key] for key in keys]
+
+    async def _aembed(self, kind, texts, embed_fn):
+        # the cache lookups are local and fast, only the model call is awaited
+        keys = [self._key(kind, t) for t in texts]
+        results = self._cached(keys)
+        to_embed = self._missing(keys, texts, results)
+        if to_embed:
+            vectors = await embed_fn(list(to_embed.values()))
+            self._save(results, list(to_embed), vectors)
+        return [results[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed("document", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed(
+            "query",
+            [text],
+            lambda batch: [self.underlying.embed_query(batch[0])]
+        )[0]
+
+    async def aembed_documents(self, texts):
+        return await self._aembed("document", texts, self.underlying.aembed_documents)
+
+    async def aembed_query(self, text):
+        async def embed_one(batch):
+            return [await self.underlying.aembed_query(batch[0])]
+
+        return (await self._aembed("query", [text], embed_one))[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        if self.store is not None:
+            stats["disk"] = self.store.stats()
+        return stats
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(path, max_entries):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SQLiteEmbeddingStore(path, max_entries=max_entries)
+        return _stores[path]
+
+
+def wrap_embeddings(underlying, model_name):
+    """Wrap an embeddings client using the EMBEDDING_CACHE_* settings.
+
+    An empty EMBEDDING_CACHE_PATH keeps the cache in memory only.
+    """
+    settings = get_embedding_cache_settings()
+    store = (
+        _get_store(settings["path"], settings["disk_max_entries"])
+        if settings["path"] else None
+    )
+    return CachedEmbeddings(
+        underlying,
+        model_name=model_name,
+        max_entries=settings["max_entries"],
+        store=store
+    )
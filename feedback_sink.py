@@ -0,0 +1,144 @@
+import atexit
+import queue
+import threading
+import time
+
+from config import get_feedback_sink_settings
+from feedback_store import store_feedback_examples_batch
+
+
+class FeedbackSink:
+    """Background writer for feedback examples.
+
+    submit() only enqueues a record, so the Streamlit request path never
+    waits on Postgres. A worker thread drains the queue and upserts in
+    batches when batch_size records are waiting, every flush_interval
+    seconds, and once more on shutdown. When the queue is full, submit
+    waits up to put_timeout and then drops the record.
+    """
+
+    def __init__(self, max_queue_size=1000, batch_size=50, flush_interval=2.0,
+                 put_timeout=0.05, writer=store_feedback_examples_batch):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        self._worker = threading.Thread(
+            target=self._run,
+            name="feedback-sink",
+            daemon=True
+        )
+        self._worker.start()
+
+    def submit(
+        self,
+        trace_id: str,
+        question: str,
+        context: list[str],
+        model_answer: str,
+        score: int | None = None,
+        reason: str | None = None,
+        comment: str | None = None,
+    ) -> bool:
+        if not trace_id or self._stop.is_set():
+            self._count("dropped")
+            return False
+
+        record = {
+            "trace_id": trace_id,
+            "question": question,
+            "context": list(context or []),
+            "model_answer": model_answer,
+            "score": score,
+            "reason": reason,
+            "comment": comment,
+        }
+
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+        self._count("queued")
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def shutdown(self, timeout=10.0):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._worker.join(timeout=timeout)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _drain(self, batch, first_wait):
+        try:
+            batch.append(self._queue.get(timeout=first_wait))
+        except queue.Empty:
+            return
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self._writer(batch)
+            self._count("flushed", len(batch))
+            self._count("batches")
+        except Exception as e:
+            self._count("failed", len(batch))
+            print(f"Feedback sink flush failed ({len(batch)} records): {e}")
+        batch.clear()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while not self._stop.is_set():
+            wait = max(0.0, deadline - time.monotonic())
+            self._drain(batch, first_wait=min(wait, 0.5))
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            self._drain(batch, first_wait=0)
+            if not batch:
+                break
+            self._flush(batch)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_feedback_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = FeedbackSink(**get_feedback_sink_settings())
+            atexit.register(_sink.shutdown)
+        return _sink
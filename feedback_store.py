@@ -1,54 +1,263 @@
+import threading
+import time
+from contextlib import contextmanager
 from datetime import date
-import psycopg2
 from urllib.parse import urlparse
-from config import get_db_url
-from datetime import datetime
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
+
+from config import get_db_url, get_feedback_pool_settings
+
+
+def _connect_kwargs():
+    db_url = get_db_url()
+
+    parsed = urlparse(db_url)
+
+    return dict(
+        dbname=parsed.path.lstrip("/"),
+        user=parsed.username,
+        password=parsed.password,
+        host=parsed.hostname,
+        port=parsed.port,
+    )
+
+
 def get_psycopg2_conn():
-        db_url = get_db_url()
+    return psycopg2.connect(**_connect_kwargs())
 
-        parsed = urlparse(db_url)
 
-        return psycopg2.connect(
-            dbname=parsed.path.lstrip("/"),
-            user=parsed.username,
-            password=parsed.password,
-            host=parsed.hostname,
-            port=parsed.port,
+class FeedbackConnectionPool:
+    """Thread-safe psycopg2 pool with a bounded wait on checkout.
+
+    ThreadedConnectionPool fails immediately when every connection is in
+    use, so getconn is retried until acquire_timeout expires. Wait times
+    are recorded so the pool can be sized from real traffic.
+    """
+
+    RETRY_INTERVAL = 0.05
+
+    def __init__(self, min_size=1, max_size=10, acquire_timeout=5.0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._pool = pg_pool.ThreadedConnectionPool(
+            min_size, max_size, **_connect_kwargs()
         )
-def increment_thumbs_down():
-    today = date.today()
-    
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "in_use": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def acquire(self):
+        start = time.monotonic()
+        while True:
+            try:
+                conn = self._pool.getconn()
+                break
+            except pg_pool.PoolError:
+                if time.monotonic() - start >= self.acquire_timeout:
+                    with self._stats_lock:
+                        self._stats["timeouts"] += 1
+                    raise TimeoutError(
+                        f"No feedback DB connection available after {self.acquire_timeout}s"
+                    )
+                time.sleep(self.RETRY_INTERVAL)
+
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            self._stats["acquired"] += 1
+            self._stats["in_use"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        with self._stats_lock:
+            self._stats["in_use"] -= 1
+        self._pool.putconn(conn, close=broken)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        acquired = stats["acquired"]
+        stats["avg_wait_seconds"] = (
+            stats["total_wait_seconds"] / acquired if acquired else 0.0
+        )
+        stats["min_size"] = self.min_size
+        stats["max_size"] = self.max_size
+        return stats
 
-    conn = get_psycopg2_conn()
+    def close(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FeedbackConnectionPool(**get_feedback_pool_settings())
+        return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+@contextmanager
+def db_cursor(commit=False):
+    """Borrow a pooled connection and yield a cursor.
+
+    Commits on success when commit=True, rolls back on error, and always
+    returns the connection to the pool.
+    """
+    db_pool = get_pool()
+    conn = db_pool.acquire()
+    broken = False
     cur = conn.cursor()
+    try:
+        yield cur
+        if commit:
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        cur.close()
+        db_pool.release(conn, broken=broken)
 
-    cur.execute("""
-        INSERT INTO rag_feedback_daily (date, thumbs_down_count)
-        VALUES (%s, 1)
-        ON CONFLICT (date)
-        DO UPDATE SET thumbs_down_count =
-            rag_feedback_daily.thumbs_down_count + 1;
-    """, (today,))
 
-    conn.commit()
-    cur.close()
-    conn.close()
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS rag_feedback_examples (
+        id SERIAL PRIMARY KEY,
+        trace_id TEXT NOT NULL,
+        question TEXT NOT NULL,
+        context TEXT,
+        model_answer TEXT,
+        score INTEGER,
+        reason TEXT,
+        comment TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # tables written before the upsert may hold duplicate trace ids from
+    # the old SELECT-then-INSERT race; keep the latest row of each so the
+    # unique index below can be built. Only runs until the index exists.
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('rag_feedback_examples_trace_id_key') IS NULL THEN
+            DELETE FROM rag_feedback_examples older
+            USING rag_feedback_examples newer
+            WHERE older.trace_id = newer.trace_id
+              AND (older.updated_at, older.id) < (newer.updated_at, newer.id);
+        END IF;
+    END
+    $$
+    """,
+    # backs the ON CONFLICT (trace_id) upsert in store_feedback_example
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS rag_feedback_examples_trace_id_key
+    ON rag_feedback_examples (trace_id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS rag_feedback_examples_created_at_idx
+    ON rag_feedback_examples (created_at DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS rag_feedback_examples_score_created_at_idx
+    ON rag_feedback_examples (score, created_at DESC)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rag_feedback_daily (
+        date DATE PRIMARY KEY,
+        thumbs_down_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS gepa_runs (
+        id SERIAL PRIMARY KEY,
+        last_feedback_at TIMESTAMP,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS gepa_runs_created_at_idx
+    ON gepa_runs (created_at DESC)
+    """,
+]
 
-def get_today_thumbs_down() -> int:
+_schema_ready = False
+
+
+def ensure_feedback_schema():
+    """Create the feedback tables and indexes if they do not exist yet.
+
+    Safe to call repeatedly; the DDL only runs once per process. Before
+    the unique trace_id index is first built, duplicate trace ids are
+    collapsed to their most recently updated row.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with db_cursor(commit=True) as cur:
+        for statement in SCHEMA_STATEMENTS:
+            cur.execute(statement)
+
+    _schema_ready = True
+
+
+def increment_thumbs_down():
     today = date.today()
 
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
+    with db_cursor(commit=True) as cur:
+        cur.execute("""
+            INSERT INTO rag_feedback_daily (date, thumbs_down_count)
+            VALUES (%s, 1)
+            ON CONFLICT (date)
+            DO UPDATE SET thumbs_down_count =
+                rag_feedback_daily.thumbs_down_count + 1;
+        """, (today,))
+
+def get_today_thumbs_down() -> int:
+    today = date.today()
 
-    cur.execute("""
-        SELECT thumbs_down_count
-        FROM rag_feedback_daily
-        WHERE date = %s
-    """, (today,))
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT thumbs_down_count
+            FROM rag_feedback_daily
+            WHERE date = %s
+        """, (today,))
 
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+        row = cur.fetchone()
 
     return row[0] if row else 0
 
@@ -61,89 +270,98 @@ def store_feedback_example(
     reason: str | None = None,
     comment: str | None = None,
 ):
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
-
-    try:
+    with db_cursor(commit=True) as cur:
         cur.execute("""
-            SELECT id FROM rag_feedback_examples 
-            WHERE trace_id = %s
-        """, (trace_id,))
-        
-        existing = cur.fetchone()
-        if existing:
-            cur.execute("""
-                UPDATE rag_feedback_examples
-                SET score = %s, 
-                    reason = %s, 
-                    comment = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE trace_id = %s
-            """, (score, reason, comment, trace_id))
-        else:
-            cur.execute("""
-                INSERT INTO rag_feedback_examples
-                (trace_id, question, context, model_answer, score, reason, comment)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                trace_id,
-                question,
-                "\n\n".join(context),
-                model_answer,
-                score,
-                reason,
-                comment,
-            ))
-
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+            INSERT INTO rag_feedback_examples
+            (trace_id, question, context, model_answer, score, reason, comment)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (trace_id)
+            DO UPDATE SET score = EXCLUDED.score,
+                reason = EXCLUDED.reason,
+                comment = EXCLUDED.comment,
+                updated_at = CURRENT_TIMESTAMP
+        """, (
+            trace_id,
+            question,
+            "\n\n".join(context),
+            model_answer,
+            score,
+            reason,
+            comment,
+        ))
+
+def store_feedback_examples_batch(records):
+    """Upsert many feedback rows in a single statement.
+
+    records are dicts with the same keys as store_feedback_example's
+    arguments. Postgres rejects an upsert that touches the same row twice,
+    so only the latest record per trace_id is kept.
+    """
+    latest = {}
+    for record in records:
+        latest[record["trace_id"]] = record
+
+    if not latest:
+        return 0
+
+    rows = [
+        (
+            r["trace_id"],
+            r["question"],
+            "\n\n".join(r.get("context") or []),
+            r["model_answer"],
+            r.get("score"),
+            r.get("reason"),
+            r.get("comment"),
+        )
+        for r in latest.values()
+    ]
+
+    with db_cursor(commit=True) as cur:
+        execute_values(cur, """
+            INSERT INTO rag_feedback_examples
+            (trace_id, question, context, model_answer, score, reason, comment)
+            VALUES %s
+            ON CONFLICT (trace_id)
+            DO UPDATE SET score = EXCLUDED.score,
+                reason = EXCLUDED.reason,
+                comment = EXCLUDED.comment,
+                updated_at = CURRENT_TIMESTAMP
+        """, rows)
+
+    return len(rows)
 
 def get_last_gepa_run_time():
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT MAX(created_at) FROM gepa_runs")
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT MAX(created_at) FROM gepa_runs")
+        row = cur.fetchone()
     return row[0]
 
 def record_gepa_run(last_feedback_at):
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO gepa_runs (last_feedback_at) VALUES (%s)",
-        (last_feedback_at,)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
-
-from datetime import datetime
+    with db_cursor(commit=True) as cur:
+        cur.execute(
+            "INSERT INTO gepa_runs (last_feedback_at) VALUES (%s)",
+            (last_feedback_at,)
+        )
 
 def count_feedback_since(timestamp):
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
-
-    if timestamp:
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM rag_feedback_examples
-            WHERE created_at > %s
-        """, (timestamp,))
-    else:
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM rag_feedback_examples
-        """)
+    with db_cursor() as cur:
+        if timestamp:
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM rag_feedback_examples
+                WHERE created_at > %s
+            """, (timestamp,))
+        else:
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM rag_feedback_examples
+            """)
 
-    count = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+        count = cur.fetchone()[0]
     return count
 
 
+if __name__ == "__main__":
+    ensure_feedback_schema()
+    print("Feedback schema is ready")
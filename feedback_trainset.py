@@ -1,25 +1,31 @@
 import dspy
-from feedback_store import get_psycopg2_conn  # Replace with your actual import
+from feedback_store import db_cursor
 
 
 def load_feedback_trainset(max_samples=4, positive_ratio=0.25):
-    conn = get_psycopg2_conn()
-    cur = conn.cursor()
-
     num_positive = int(max_samples * positive_ratio)
     num_non_positive = max_samples - num_positive
 
     trainset = []
 
-    cur.execute("""
-        SELECT question, context, model_answer, score, reason
-        FROM rag_feedback_examples
-        WHERE score = 1
-        ORDER BY created_at DESC
-        LIMIT %s
-    """, (num_positive,))
-    
-    positives = cur.fetchall()
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT question, context, model_answer, score, reason
+            FROM rag_feedback_examples
+            WHERE score = 1
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (num_positive,))
+        positives = cur.fetchall()
+
+        cur.execute("""
+            SELECT question, context, model_answer, score, reason
+            FROM rag_feedback_examples
+            WHERE score IS DISTINCT FROM 1
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (num_non_positive,))
+        non_positives = cur.fetchall()
     
     for question, context, model_answer, score, reason in positives:
         trainset.append(
@@ -31,16 +37,7 @@ def load_feedback_trainset(max_samples=4, positive_ratio=0.25):
                 human_feedback=reason or "Good answer",
             ).with_inputs("question", "context")
         )
-    cur.execute("""
-        SELECT question, context, model_answer, score, reason
-        FROM rag_feedback_examples
-        WHERE score IS DISTINCT FROM 1
-        ORDER BY created_at DESC
-        LIMIT %s
-    """, (num_non_positive,))
-    
-    non_positives = cur.fetchall()
-    
+
     for question, context, model_answer, score, reason in non_positives:
         example_data = {
             "question": question,
@@ -54,8 +51,6 @@ def load_feedback_trainset(max_samples=4, positive_ratio=0.25):
         trainset.append(
             dspy.Example(**example_data).with_inputs("question", "context")
         )
-    cur.close()
-    conn.close()
 
     return trainset
 
@@ -1,7 +1,9 @@
 import dspy
-import time
 from typing import Optional, Union
 
+from budget_controller import BudgetExceeded
+from judge_cache import get_judge_cache, judge_key
+
 
 class GEPARAGJudge(dspy.Signature):
     """Evaluate if the model's answer is accurate and well-grounded in the retrieved context.
@@ -21,6 +23,7 @@ class HybridGEPARAGMetric:
 
     def __init__(self):
         self.llm_judge = dspy.ChainOfThought(GEPARAGJudge)
+        self.cache = get_judge_cache()
 
     def __call__(
         self,
@@ -42,8 +45,6 @@ class HybridGEPARAGMetric:
 
         else:
             try:
-                time.sleep(6)
-
                 context = (
                     "\n".join(gold.context)
                     if isinstance(gold.context, list)
@@ -52,16 +53,26 @@ class HybridGEPARAGMetric:
 
                 answer = pred.answer if hasattr(pred, "answer") else str(pred)
 
-                result = self.llm_judge(
-                    context=context,
-                    question=gold.question,
-                    answer=answer,
-                )
-
-                verdict = result.verdict.strip().upper()
-                score = 1.0 if verdict == "YES" else 0.0
-                feedback = result.feedback.strip()
-
+                key = judge_key(self.llm_judge, context, gold.question, answer)
+                cached = self.cache.get(key)
+
+                if cached is not None:
+                    score = cached["score"]
+                    feedback = cached["feedback"]
+                else:
+                    result = self.llm_judge(
+                        context=context,
+                        question=gold.question,
+                        answer=answer,
+                    )
+
+                    verdict = result.verdict.strip().upper()
+                    score = 1.0 if verdict == "YES" else 0.0
+                    feedback = result.feedback.strip()
+                    self.cache.put(key, {"score": score, "feedback": feedback})
+
+            except BudgetExceeded:
+                raise
             except Exception as e:
                 score = 0.0
                 feedback = f"Evaluation error: {str(e)}"
@@ -1,10 +1,12 @@
+from functools import partial
+
 from apscheduler.schedulers.blocking import BlockingScheduler
-from optimize_gepa import run_gepa_optimization
+from optimizer_runner import run_optimizer
 
 scheduler = BlockingScheduler(timezone="Asia/Kolkata")
 
 scheduler.add_job(
-    run_gepa_optimization,
+    partial(run_optimizer, "gepa"),
     trigger="interval",
     hours=24,
     id="gepa_daily_job",
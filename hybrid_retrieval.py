@@ -0,0 +1,115 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+from metadata_filters import filter_clause, filtered_similarity_search
+
+TS_CONFIG = "english"
+RRF_K = 60
+
+# shared by every retriever; each question submits exactly two searches
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hybrid-search")
+
+
+def ensure_text_search_index(engine):
+    """Create the GIN full-text index used by HybridRetriever.
+
+    The expression must match the one in the search query exactly or
+    Postgres will not use the index.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS langchain_pg_embedding_document_fts_idx
+            ON langchain_pg_embedding
+            USING GIN (to_tsvector('{TS_CONFIG}', document))
+        """))
+
+
+def doc_key(doc):
+    if getattr(doc, "id", None):
+        return doc.id
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists, k=RRF_K):
+    """Fuse ranked lists; a document scores sum(1 / (k + rank)) over lists."""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked]
+
+
+class HybridRetriever:
+    """Dense pgvector search plus Postgres full-text search, fused with RRF.
+
+    Exact SQL keywords (COALESCE, RANK() OVER) are matched by the
+    full-text side even when the embedding ranks them low. Both searches
+    run in parallel and over-fetch before fusion.
+    """
+
+    def __init__(self, vectorstore, engine, collection_name, k=4, fetch_k=None):
+        self.vectorstore = vectorstore
+        self.engine = engine
+        self.collection_name = collection_name
+        self.k = k
+        self.fetch_k = fetch_k or max(k * 2, 10)
+
+    def text_search(self, question, limit, filters=None):
+        clause, params = filter_clause(filters)
+        # OR the terms together; the default AND would require every word
+        # of a natural-language question to appear in one chunk
+        query = text(f"""
+            SELECT e.id, e.document, e.cmetadata
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON c.uuid = e.collection_id,
+                 to_tsquery('{TS_CONFIG}', replace(
+                     plainto_tsquery('{TS_CONFIG}', :question)::text, '&', '|'
+                 )) AS q
+            WHERE c.name = :collection
+              AND to_tsvector('{TS_CONFIG}', e.document) @@ q
+              {clause}
+            ORDER BY ts_rank_cd(to_tsvector('{TS_CONFIG}', e.document), q) DESC
+            LIMIT :limit
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, {
+                **params,
+                "question": question,
+                "collection": self.collection_name,
+                "limit": limit,
+            }).all()
+        return [
+            Document(id=row[0], page_content=row[1], metadata=row[2] or {})
+            for row in rows
+        ]
+
+    def vector_search(self, question, limit, query_embedding=None, filters=None):
+        if query_embedding is None:
+            query_embedding = self.vectorstore.embeddings.embed_query(question)
+        if filters:
+            return filtered_similarity_search(
+                self.engine, self.collection_name, query_embedding, limit, filters
+            )
+        return self.vectorstore.similarity_search_by_vector(query_embedding, k=limit)
+
+    def invoke(self, question, query_embedding=None, filters=None):
+        dense = _executor.submit(
+            self.vector_search, question, self.fetch_k, query_embedding, filters
+        )
+        lexical = _executor.submit(self.text_search, question, self.fetch_k, filters)
+
+        result_lists = [dense.result()]
+        try:
+            result_lists.append(lexical.result())
+        except Exception as e:
+            # full-text search is an enhancement; fall back to dense results
+            print(f"Full-text search failed: {e}")
+
+        return reciprocal_rank_fusion(result_lists)[:self.k]
@@ -0,0 +1,432 @@
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    FIRST_COMPLETED,
+    as_completed,
+    wait,
+)
+from pathlib import Path
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from chunking import make_splitter
+from config import get_ingestion_settings, get_chunking_config
+from rate_limit import RateBudget, estimate_tokens
+from vector_store import get_registry
+from hybrid_retrieval import ensure_text_search_index
+from metadata_filters import ensure_metadata_indexes
+from parent_documents import ensure_parent_table, split_children, store_parents
+
+
+def chunk_id(chunk, splitter_params):
+    """Stable id for a chunk: same source, page, text and splitter -> same id."""
+    fields = {
+        "source": chunk.metadata.get("source"),
+        "page": chunk.metadata.get("page"),
+        "text": chunk.page_content,
+        "splitter": splitter_params,
+    }
+    # only tagged chunks hash their tenant, so untagged ids stay unchanged
+    if chunk.metadata.get("tenant"):
+        fields["tenant"] = chunk.metadata["tenant"]
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingPipeline:
+    """Embed chunks in batches on a bounded thread pool and bulk-insert them.
+
+    Each batch waits for the shared request/token budget, is retried with
+    exponential backoff on errors, and is inserted as soon as it is
+    embedded. A batch that still fails after max_retries is counted as
+    failed instead of aborting the whole run.
+    """
+
+    def __init__(self, vectorstore, batch_size=64, max_workers=4,
+                 requests_per_minute=1500, tokens_per_minute=1000000,
+                 max_retries=5, backoff_seconds=1.0):
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.budget = RateBudget(requests_per_minute, tokens_per_minute)
+
+    @classmethod
+    def from_settings(cls, vectorstore):
+        return cls(vectorstore, **get_ingestion_settings())
+
+    def _batches(self, items):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _embed_batch(self, batch):
+        texts = [doc.page_content for _, doc in batch]
+        tokens = sum(estimate_tokens(t) for t in texts)
+
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire(tokens)
+            try:
+                return self.vectorstore.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                print(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _insert(self, batch, vectors):
+        self.vectorstore.add_embeddings(
+            texts=[doc.page_content for _, doc in batch],
+            embeddings=vectors,
+            metadatas=[doc.metadata for _, doc in batch],
+            ids=[cid for cid, _ in batch],
+        )
+
+    def _texts_embedded(self):
+        # CachedEmbeddings counts the texts it actually sent to the model
+        stats = getattr(self.vectorstore.embeddings, "stats", None)
+        return stats()["misses"] if stats is not None else None
+
+    def run(self, items):
+        """Embed and insert an iterable of (id, document) pairs."""
+        stats = {"chunks": 0, "batches": 0, "failed_chunks": 0, "failed_batches": 0}
+        start = time.monotonic()
+        embedded_before = self._texts_embedded()
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                batch = pending.pop(future)
+                try:
+                    vectors = future.result()
+                    self._insert(batch, vectors)
+                    stats["chunks"] += len(batch)
+                    stats["batches"] += 1
+                except Exception as e:
+                    stats["failed_chunks"] += len(batch)
+                    stats["failed_batches"] += 1
+                    print(f"Embedding batch of {len(batch)} chunks failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch in self._batches(items):
+                # keep a bounded number of batches in flight so a large
+                # corpus is streamed instead of held in memory
+                while len(pending) >= self.max_workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(self._embed_batch, batch)] = batch
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        elapsed = time.monotonic() - start
+        stats["seconds"] = round(elapsed, 2)
+        stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        # cache hits are inserted without a model call, so this can be
+        # lower than chunks_per_sec
+        if embedded_before is not None:
+            stats["embedded_texts"] = self._texts_embedded() - embedded_before
+        else:
+            stats["embedded_texts"] = stats["chunks"] + stats["failed_chunks"]
+        stats["embeddings_per_sec"] = round(stats["embedded_texts"] / elapsed, 2) if elapsed else 0.0
+        return stats
+
+
+def sync_chunks(collection_name, source, chunks, splitter_params, pipeline=None, parents=None,
+                tenant=None):
+    """Make the collection hold exactly these chunks for one source and tenant.
+
+    Chunks whose id already exists are skipped, ids of this source that
+    are no longer produced are deleted, and only new or changed chunks
+    are embedded and inserted. parents, if given, replace the source's
+    parent sections. Returns counts of added, failed, skipped and removed
+    chunks plus the pipeline throughput.
+    """
+    registry = get_registry()
+    vectorstore = registry.get_vectorstore(collection_name)
+
+    if parents is not None:
+        # parents go first so a child is never stored without its parent
+        store_parents(registry.get_engine(), collection_name, source, parents, tenant=tenant)
+
+    wanted = {}
+    for chunk in chunks:
+        chunk.metadata["chunk_id"] = chunk_id(chunk, splitter_params)
+        # identical chunks on the same page collapse into one row
+        wanted.setdefault(chunk.metadata["chunk_id"], chunk)
+
+    existing = registry.collection_ids(collection_name, source=source, tenant=tenant)
+
+    to_add = [(cid, c) for cid, c in wanted.items() if cid not in existing]
+    to_remove = sorted(existing - wanted.keys())
+
+    if to_remove:
+        vectorstore.delete(ids=to_remove)
+
+    pipeline = pipeline or EmbeddingPipeline.from_settings(vectorstore)
+    throughput = pipeline.run(to_add)
+
+    return {
+        "added": throughput["chunks"],
+        "failed": throughput["failed_chunks"],
+        "skipped": len(wanted) - len(to_add),
+        "removed": len(to_remove),
+        "throughput": throughput,
+    }
+
+
+def parse_pdf(path, source, splitter_params, tenant=None):
+    """Load and split one PDF. Runs in a worker process.
+
+    Returns (pages, chunks, parents). When splitter_params has a
+    child_chunk_size the splitter's chunks become parent sections and
+    the returned chunks are their small children; otherwise parents is
+    empty.
+    """
+    loader = PyPDFLoader(str(path))
+    splitter = make_splitter(
+        splitter_params["splitter"],
+        splitter_params["chunk_size"],
+        splitter_params["chunk_overlap"]
+    )
+    pages = []
+    for page in loader.lazy_load():
+        page.metadata["source"] = source
+        if tenant:
+            page.metadata["tenant"] = tenant
+        pages.append(page)
+    # split the whole file at once so headings carry across page breaks
+    chunks = splitter.split_documents(pages)
+
+    if not splitter_params.get("child_chunk_size"):
+        return len(pages), chunks, []
+
+    for parent in chunks:
+        parent.metadata["parent_id"] = chunk_id(parent, splitter_params)
+    children = split_children(
+        chunks,
+        splitter_params["child_chunk_size"],
+        splitter_params.get("child_chunk_overlap", 0)
+    )
+    return len(pages), children, chunks
+
+
+def resolve_pdf_paths(patterns):
+    """Expand files, directories (searched recursively) and glob patterns."""
+    paths = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.extend(sorted(path.rglob("*.pdf")))
+        elif path.is_file():
+            paths.append(path)
+        else:
+            paths.extend(Path(p) for p in sorted(glob.glob(pattern, recursive=True)))
+    return list(dict.fromkeys(p.resolve() for p in paths if p.suffix.lower() == ".pdf"))
+
+
+def collection_for_file(path, prefix):
+    stem = re.sub(r"[^a-z0-9_]+", "_", path.stem.lower()).strip("_")
+    return f"{prefix}{stem or 'doc'}"
+
+
+class IngestCheckpoint:
+    """Records which files were fully ingested so a rerun can resume.
+
+    A file is only considered done when its size, mtime, target collection
+    and splitter settings all match what was recorded.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._done = {}
+        if self.path.exists():
+            self._done = json.loads(self.path.read_text())
+
+    @staticmethod
+    def _signature(path, collection_name, splitter_params, tenant=None):
+        stat = path.stat()
+        signature = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "collection": collection_name,
+            "splitter": splitter_params,
+        }
+        if tenant:
+            signature["tenant"] = tenant
+        return signature
+
+    def is_done(self, path, collection_name, splitter_params, tenant=None):
+        return self._done.get(str(path)) == self._signature(
+            path, collection_name, splitter_params, tenant
+        )
+
+    def mark_done(self, path, collection_name, splitter_params, tenant=None):
+        self._done[str(path)] = self._signature(path, collection_name, splitter_params, tenant)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._done, indent=2))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self._done = {}
+        if self.path.exists():
+            self.path.unlink()
+
+
+def ingest_paths(
+    patterns,
+    collection_name="sql_docs",
+    per_file_collections=False,
+    collection_prefix="",
+    splitter=None,
+    chunk_size=None,
+    chunk_overlap=None,
+    child_chunk_size=None,
+    tenant=None,
+    parse_workers=None,
+    checkpoint_path=".cache/ingest_checkpoint.json",
+    resume=True,
+):
+    """Ingest every PDF matched by patterns.
+
+    PDFs are parsed in a process pool and each parsed file is synced as
+    soon as it is ready, while the pool keeps parsing the rest. All files
+    headed for the same collection share one embedding pipeline. Finished
+    files are written to the checkpoint, so an interrupted run picks up
+    where it stopped.
+
+    splitter, chunk_size, chunk_overlap and child_chunk_size override the
+    per-collection settings from get_chunking_config when given. tenant
+    tags every chunk for filtered retrieval; each tenant's copy of a file
+    is synced separately.
+    """
+    overrides = {
+        key: value
+        for key, value in (
+            ("splitter", splitter),
+            ("chunk_size", chunk_size),
+            ("chunk_overlap", chunk_overlap),
+            ("child_chunk_size", child_chunk_size),
+        )
+        if value is not None
+    }
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    if not resume:
+        checkpoint.clear()
+
+    paths = resolve_pdf_paths(patterns)
+    if not paths:
+        raise FileNotFoundError(f"No PDFs found for {patterns}")
+
+    # the file name is the source unless two inputs share it
+    names = [p.name for p in paths]
+    sources = {
+        p: p.name if names.count(p.name) == 1 else str(p)
+        for p in paths
+    }
+    targets = {
+        p: collection_for_file(p, collection_prefix) if per_file_collections else collection_name
+        for p in paths
+    }
+
+    splitter_params = {
+        target: {**get_chunking_config(target), **overrides}
+        for target in set(targets.values())
+    }
+
+    todo = [
+        p for p in paths
+        if not checkpoint.is_done(p, targets[p], splitter_params[targets[p]], tenant)
+    ]
+    report = {
+        "files": len(paths),
+        "files_skipped": len(paths) - len(todo),
+        "files_ingested": 0,
+        "files_failed": 0,
+        "pages": 0,
+        "added": 0,
+        "failed": 0,
+        "skipped": 0,
+        "removed": 0,
+    }
+
+    registry = get_registry()
+    pipelines = {}
+    start = time.monotonic()
+
+    # make sure the collection tables exist before indexing them; with
+    # per-file collections open one that gets data rather than creating
+    # an empty default collection
+    if not per_file_collections:
+        registry.get_vectorstore(collection_name)
+    elif todo:
+        registry.get_vectorstore(targets[todo[0]])
+    ensure_text_search_index(registry.get_engine())
+    ensure_parent_table(registry.get_engine())
+    ensure_metadata_indexes(registry.get_engine())
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        futures = {
+            pool.submit(parse_pdf, p, sources[p], splitter_params[targets[p]], tenant): p
+            for p in todo
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            target = targets[path]
+            try:
+                pages, chunks, parents = future.result()
+                if target not in pipelines:
+                    pipelines[target] = EmbeddingPipeline.from_settings(
+                        registry.get_vectorstore(target)
+                    )
+                result = sync_chunks(
+                    target,
+                    sources[path],
+                    chunks,
+                    splitter_params[target],
+                    pipeline=pipelines[target],
+                    parents=parents,
+                    tenant=tenant
+                )
+            except Exception as e:
+                report["files_failed"] += 1
+                print(f"{path}: failed ({e})")
+                continue
+
+            report["pages"] += pages
+            for key in ("added", "failed", "skipped", "removed"):
+                report[key] += result[key]
+
+            if result["failed"]:
+                report["files_failed"] += 1
+                print(f"{path}: {result['failed']} chunks failed, will retry on next run")
+            else:
+                report["files_ingested"] += 1
+                checkpoint.mark_done(path, target, splitter_params[target], tenant)
+
+            print(
+                f"{path.name} -> {target}: pages={pages} added={result['added']} "
+                f"skipped={result['skipped']} removed={result['removed']}"
+            )
+
+    elapsed = time.monotonic() - start
+    report["seconds"] = round(elapsed, 2)
+    report["chunks_per_sec"] = round(report["added"] / elapsed, 2) if elapsed else 0.0
+    return report
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import dspy
+
+from config import get_judge_cache_settings
+
+
+def judge_fingerprint(judge):
+    """Instructions and fields of every predictor in a judge module.
+
+    Editing a judge's signature changes the fingerprint, so results from
+    the old rubric are never reused.
+    """
+    parts = []
+    for name, predictor in judge.named_predictors():
+        signature = predictor.signature
+        parts.append({
+            "name": name,
+            "instructions": signature.instructions,
+            "fields": list(signature.fields),
+        })
+    return parts
+
+
+def judge_key(judge, context, question, answer, lm=None):
+    lm = lm or dspy.settings.lm
+    payload = json.dumps(
+        {
+            "judge": judge_fingerprint(judge),
+            "model": getattr(lm, "model", str(lm)),
+            "context": context,
+            "question": question,
+            "answer": answer,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """SQLite cache of LLM-judge results shared across metrics and runs.
+
+    Keys are content hashes (see judge_key), so any optimizer judging the
+    same answer to the same question reuses the stored verdict. Once the
+    table grows past max_entries the least recently used tenth is
+    deleted.
+    """
+
+    def __init__(self, path, max_entries=50000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS judge_results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS judge_results_last_used_idx
+            ON judge_results (last_used)
+        """)
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM judge_results").fetchone()[0]
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM judge_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE judge_results SET last_used = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM judge_results WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_results (key, result, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(result), time.time())
+            )
+            if not exists:
+                self._entries += 1
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # drop a batch at once so eviction does not run on every insert
+        target = int(self.max_entries * 0.9)
+        deleted = self._conn.execute("""
+            DELETE FROM judge_results WHERE key IN (
+                SELECT key FROM judge_results ORDER BY last_used LIMIT ?
+            )
+        """, (self._entries - target,)).rowcount
+        self._entries -= deleted
+        self._stats["evictions"] += deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryJudgeCache(JudgeCache):
+    """Same interface kept in a per-process SQLite database."""
+
+    def __init__(self, max_entries=50000):
+        super().__init__(":memory:", max_entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_judge_cache():
+    """The shared judge cache; an empty JUDGE_CACHE_PATH keeps it in memory."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_judge_cache_settings()
+            if settings["path"]:
+                _cache = JudgeCache(settings["path"], settings["max_entries"])
+            else:
+                _cache = MemoryJudgeCache(settings["max_entries"])
+        return _cache
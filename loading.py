@@ -1,40 +1,57 @@
+import argparse
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_postgres import PGVector
-from config import get_db_url,get_gemini_api_key
+from ingestion import ingest_paths
+from tenants import get_router
 
 data_dir=Path("data/uploads")
 pdf_name="sql.pdf"
 col_name="sql_docs"
 
-def main():
-    db_url=get_db_url()
-    gemini_key=get_gemini_api_key()
-    pdf_path=data_dir/pdf_name
-    if not pdf_path.exists():
-        raise FileNotFoundError("pdf not there")
-    
-    loader=PyPDFLoader(str(pdf_path))
-    pages=loader.load()
-    print(len(pages))
+def parse_args():
+    parser=argparse.ArgumentParser(description="Ingest PDFs into pgvector")
+    parser.add_argument("paths",nargs="*",default=[str(data_dir/pdf_name)],
+                        help="PDF files, directories or glob patterns")
+    parser.add_argument("--collection",default=None,
+                        help="shared collection for every file (default: the --tenant's collection, else sql_docs)")
+    parser.add_argument("--per-file-collections",action="store_true",
+                        help="give each file its own collection named after it")
+    parser.add_argument("--collection-prefix",default="",
+                        help="prefix for per-file collection names")
+    parser.add_argument("--splitter",choices=["recursive","structure"],default=None,
+                        help="override the collection's splitter from chunking.json")
+    parser.add_argument("--chunk-size",type=int,default=None)
+    parser.add_argument("--chunk-overlap",type=int,default=None)
+    parser.add_argument("--child-chunk-size",type=int,default=None,
+                        help="store small child chunks for search, linked to parent sections of --chunk-size")
+    parser.add_argument("--tenant",default=None,
+                        help="tag every chunk with this tenant and ingest into its collection from tenants.json")
+    parser.add_argument("--workers",type=int,default=None,
+                        help="PDF parsing processes (default: CPU count)")
+    parser.add_argument("--checkpoint",default=".cache/ingest_checkpoint.json")
+    parser.add_argument("--restart",action="store_true",
+                        help="ignore the checkpoint and reprocess every file")
+    return parser.parse_args()
 
-    for p in pages:
-        p.metadata["source"]=pdf_name
-    splitter=RecursiveCharacterTextSplitter(chunk_size=800,chunk_overlap=100)
-    chunks=splitter.split_documents(pages)
-    print(len(chunks))
-    embeddings=GoogleGenerativeAIEmbeddings(
-        model="text-embedding-004",
-        google_api_key=gemini_key
-    )
-    vectorstore=PGVector(
-        connection=db_url,
-        embeddings=embeddings,
-        collection_name=col_name,
-        use_jsonb=True,
+def main():
+    args=parse_args()
+    collection=args.collection or (get_router().collection_for(args.tenant) if args.tenant else col_name)
+    report=ingest_paths(
+        args.paths,
+        collection_name=collection,
+        per_file_collections=args.per_file_collections,
+        collection_prefix=args.collection_prefix,
+        splitter=args.splitter,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        child_chunk_size=args.child_chunk_size,
+        tenant=args.tenant,
+        parse_workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=not args.restart,
     )
-    vectorstore.add_documents(chunks)
+    print(f"files={report['files']} ingested={report['files_ingested']} resumed_skip={report['files_skipped']} failed={report['files_failed']}")
+    print(f"added={report['added']} failed={report['failed']} skipped={report['skipped']} removed={report['removed']}")
+    print(f"{report['chunks_per_sec']} chunks/sec in {report['seconds']}s")
+    return report
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
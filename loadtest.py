@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+
+import dspy
+
+from async_rag import AsyncRAGPipeline
+from dspy_rag import RAGModule
+
+STUB_CONTEXT = [
+    "The inner join selects all rows from both tables as long as there is a match between the columns.",
+    "The COALESCE function replaces NULL values with a default value.",
+    "The RANK() function returns the position of any row in the specified partition.",
+    "The REPLACE() string function replaces all occurrences of a source substring with a target substring.",
+]
+
+STUB_QUESTIONS = [
+    "How does an inner join work?",
+    "How do I replace NULL values in a column?",
+    "How can I rank salaries within each department?",
+    "How do I replace a word inside a string?",
+]
+
+
+class StubLM(dspy.BaseLM):
+    """LM that answers instantly after a simulated network delay."""
+
+    def __init__(self, latency=0.2, jitter=0.05):
+        super().__init__(model="stub/rag", cache=False)
+        self.latency = latency
+        self.jitter = jitter
+
+    def _response(self):
+        content = (
+            "[[ ## reasoning ## ]]\nThe context answers the question.\n\n"
+            "[[ ## answer ## ]]\nStub answer based on the provided context.\n\n"
+            "[[ ## completed ## ]]"
+        )
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=content, tool_calls=None),
+                finish_reason="stop",
+            )],
+            usage={"prompt_tokens": 400, "completion_tokens": 40, "total_tokens": 440},
+        )
+
+    def _delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        time.sleep(self._delay())
+        return self._response()
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._response()
+
+
+class StubEmbeddings:
+    def __init__(self, latency=0.02, dims=768):
+        self.latency = latency
+        self.dims = dims
+
+    def _vector(self, text):
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        return [seed[i % len(seed)] / 255.0 for i in range(self.dims)]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class StubVectorStore:
+    def __init__(self, latency=0.01):
+        self.latency = latency
+
+    async def asimilarity_search_by_vector(self, embedding, k=4):
+        await asyncio.sleep(self.latency)
+        return [
+            SimpleNamespace(page_content=text, metadata={"source": "stub.pdf", "page": i})
+            for i, text in enumerate(STUB_CONTEXT[:k])
+        ]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(pipeline, requests, concurrency):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(STUB_QUESTIONS[i % len(STUB_QUESTIONS)])
+
+    async def client():
+        nonlocal errors
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                await pipeline.answer(question)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                print(f"request failed: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the async RAG path against stubs")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="simulated clients")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="pipeline semaphore size")
+    parser.add_argument("--lm-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.01)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    dspy.configure(lm=StubLM(latency=args.lm_latency), track_usage=True)
+
+    pipeline = AsyncRAGPipeline(
+        program=RAGModule(),
+        embeddings=StubEmbeddings(latency=args.embed_latency),
+        vectorstore=StubVectorStore(latency=args.search_latency),
+        max_concurrency=args.max_concurrency,
+    )
+
+    report = asyncio.run(run_load(pipeline, args.requests, args.concurrency))
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+FILTER_KEYS = ("source", "page_min", "page_max", "section", "tenant")
+
+
+def ensure_metadata_indexes(engine):
+    """Create the indexes filtered searches rely on.
+
+    Equality filters use a jsonb_path_ops GIN index through @>, a list of
+    sources uses an expression index on source, and page ranges use an
+    integer expression index on page. The expressions must match the ones
+    in filter_clause or Postgres will not use the indexes.
+    """
+    with engine.begin() as conn:
+        # PGVector may already ship a jsonb_path_ops index on cmetadata
+        has_gin = conn.execute(text("""
+            SELECT 1 FROM pg_indexes
+            WHERE tablename = 'langchain_pg_embedding'
+              AND indexdef ILIKE '%gin%cmetadata jsonb_path_ops%'
+        """)).first()
+        if not has_gin:
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS langchain_pg_embedding_cmetadata_gin_idx
+                ON langchain_pg_embedding USING GIN (cmetadata jsonb_path_ops)
+            """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS langchain_pg_embedding_source_idx
+            ON langchain_pg_embedding ((cmetadata->>'source'))
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS langchain_pg_embedding_page_idx
+            ON langchain_pg_embedding (((cmetadata->>'page')::integer))
+        """))
+
+
+def filter_clause(filters, alias="e"):
+    """Translate a filter dict into SQL conditions and bind parameters.
+
+    filters may hold source (a name or a list of names), page_min and
+    page_max (inclusive, as stored by the PDF loader), section and
+    tenant. Returns ("AND ..." or "", params).
+    """
+    if not filters:
+        return "", {}
+
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown metadata filters {sorted(unknown)}, expected {FILTER_KEYS}")
+
+    conditions = []
+    params = {}
+
+    contains = {
+        key: filters[key]
+        for key in ("section", "tenant")
+        if filters.get(key) is not None
+    }
+    source = filters.get("source")
+    if isinstance(source, (list, tuple, set)):
+        conditions.append(f"{alias}.cmetadata->>'source' = ANY(CAST(:filter_sources AS TEXT[]))")
+        params["filter_sources"] = list(source)
+    elif source is not None:
+        contains["source"] = source
+
+    if contains:
+        conditions.append(f"{alias}.cmetadata @> CAST(:filter_contains AS JSONB)")
+        params["filter_contains"] = json.dumps(contains)
+
+    if filters.get("page_min") is not None:
+        conditions.append(f"({alias}.cmetadata->>'page')::integer >= :filter_page_min")
+        params["filter_page_min"] = int(filters["page_min"])
+    if filters.get("page_max") is not None:
+        conditions.append(f"({alias}.cmetadata->>'page')::integer <= :filter_page_max")
+        params["filter_page_max"] = int(filters["page_max"])
+
+    if not conditions:
+        return "", {}
+    return "AND " + " AND ".join(conditions), params
+
+
+def _vector_query(filters):
+    clause, params = filter_clause(filters)
+    # <=> is cosine distance, PGVector's default strategy
+    query = text(f"""
+        SELECT e.id, e.document, e.cmetadata
+        FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+        WHERE c.name = :collection {clause}
+        ORDER BY e.embedding <=> CAST(:embedding AS vector)
+        LIMIT :limit
+    """)
+    return query, params
+
+
+def _to_documents(rows):
+    return [
+        Document(id=row[0], page_content=row[1], metadata=row[2] or {})
+        for row in rows
+    ]
+
+
+def filtered_similarity_search(engine, collection_name, embedding, k, filters):
+    """Nearest chunks to embedding among those matching filters."""
+    query, params = _vector_query(filters)
+    with engine.connect() as conn:
+        rows = conn.execute(query, {
+            **params,
+            "collection": collection_name,
+            "embedding": str(list(embedding)),
+            "limit": k,
+        }).all()
+    return _to_documents(rows)
+
+
+async def afiltered_similarity_search(async_engine, collection_name, embedding, k, filters):
+    query, params = _vector_query(filters)
+    async with async_engine.connect() as conn:
+        result = await conn.execute(query, {
+            **params,
+            "collection": collection_name,
+            "embedding": str(list(embedding)),
+            "limit": k,
+        })
+        rows = result.all()
+    return _to_documents(rows)
@@ -1,5 +1,7 @@
 import dspy
-import time
+
+from budget_controller import BudgetExceeded
+from judge_cache import get_judge_cache, judge_key
 
 class RAGJudge(dspy.Signature):
     """
@@ -20,16 +22,17 @@ class RAGMetric:
 
     def __init__(self):
         self.judge = dspy.ChainOfThought(RAGJudge)
-        self.cache = {}
+        # persistent and shared with the other metrics; safe across threads
+        self.cache = get_judge_cache()
 
     def __call__(self, example, prediction, trace=None):
-        key = (example.question, prediction.answer)
-
-        if key in self.cache:
-            return self.cache[key]
+        key = judge_key(self.judge, example.context, example.question, prediction.answer)
 
-        time.sleep(15)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached["score"]
 
+        # judge calls are paced by the shared LM rate limiter
         try:
             result = self.judge(
                 context=example.context,
@@ -38,8 +41,10 @@ class RAGMetric:
             )
 
             score = max(0.0, min(1.0, float(result.score)))
-            self.cache[key] = score
+            self.cache.put(key, {"score": score})
             return score
 
+        except BudgetExceeded:
+            raise
         except Exception:
             return 0.0
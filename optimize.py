@@ -4,7 +4,7 @@ from dspy_config import configure_lm
 from dspy_rag import rag_module
 from trainset import trainset
 from metrics import RAGMetric
-configure_lm() 
+configure_lm(rate_profile="optimization")
 metric = RAGMetric()
 optimizer = BootstrapFewShot(
     metric=metric,
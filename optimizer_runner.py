@@ -0,0 +1,425 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from config import get_optimizer_settings, get_optimizer_config
+from optimizer_utils import Budget, extract_token_summary, in_current_context
+
+# dspy, langfuse and the database are only touched once a run starts, so
+# importing this module (or --list) costs nothing
+
+
+class OptimizerSpec:
+    """How to build, compile and save one optimizer.
+
+    init and compile are the default keyword arguments for the optimizer
+    constructor and its compile(); optimizers.json can override them.
+    """
+
+    def __init__(self, name, compile_fn, output_path, metric="rag", trainset="static",
+                 init=None, compile=None, train_size=None, eval_size=None, on_complete=None):
+        self.name = name
+        self.compile_fn = compile_fn
+        self.output_path = output_path
+        self.metric = metric
+        self.trainset = trainset
+        self.init = init or {}
+        self.compile = compile or {}
+        self.train_size = train_size
+        self.eval_size = eval_size
+        self.on_complete = on_complete
+
+
+OPTIMIZERS = {}
+
+
+def register_optimizer(name, output_path, **options):
+    """Register compile_fn(student, trainset, metric, num_threads, init, compile)."""
+    def decorator(compile_fn):
+        OPTIMIZERS[name] = OptimizerSpec(name, compile_fn, output_path, **options)
+        return compile_fn
+    return decorator
+
+
+def load_static_trainset():
+    from trainset import trainset
+    return trainset
+
+
+def load_feedback_examples():
+    from feedback_store import ensure_feedback_schema
+    from feedback_trainset import load_feedback_trainset
+    ensure_feedback_schema()
+    return load_feedback_trainset(max_samples=4, positive_ratio=0.25)
+
+
+TRAINSETS = {
+    "static": load_static_trainset,
+    "feedback": load_feedback_examples,
+}
+
+
+def make_metric(kind):
+    if kind == "gepa":
+        from gepa_metrics import HybridGEPARAGMetric
+        return HybridGEPARAGMetric()
+    from metrics import RAGMetric
+    return RAGMetric()
+
+
+def record_gepa(program, started_at):
+    from feedback_store import record_gepa_run
+    record_gepa_run(last_feedback_at=started_at)
+
+
+@register_optimizer(
+    "gepa", "optimized_rag_gepa.json", metric="gepa", trainset="feedback",
+    init={
+        "max_metric_calls": 5,
+        "reflection_minibatch_size": 3,
+        "candidate_selection_strategy": "current_best",
+        "component_selector": "round_robin",
+        "skip_perfect_score": True,
+        "track_stats": True,
+        "seed": 42,
+    },
+    train_size=3, eval_size=5, on_complete=record_gepa,
+)
+def compile_gepa(student, trainset, metric, num_threads, init, compile):
+    import dspy
+    from dspy.teleprompt import GEPA
+
+    gepa = GEPA(metric=metric, reflection_lm=dspy.settings.lm, num_threads=num_threads, **init)
+    return gepa.compile(student=student, trainset=trainset, **compile)
+
+
+@register_optimizer(
+    "copro", "optimized_rag_copro.json",
+    init={"breadth": 2, "depth": 1, "init_temperature": 1.0, "verbose": True},
+    train_size=3,
+)
+def compile_copro(student, trainset, metric, num_threads, init, compile):
+    import dspy
+    from dspy.teleprompt import COPRO
+
+    copro = COPRO(prompt_model=dspy.settings.lm, metric=metric, **init)
+    eval_kwargs = {"num_threads": num_threads, "display_progress": True, "display_table": True}
+    return copro.compile(student=student, trainset=trainset, eval_kwargs=eval_kwargs, **compile)
+
+
+@register_optimizer(
+    "mipro", "optimized_rag_mipro.json",
+    init={"num_candidates": 2, "init_temperature": 1.0, "verbose": True, "auto": None},
+    compile={
+        "num_trials": 2,
+        "max_bootstrapped_demos": 1,
+        "max_labeled_demos": 1,
+        "requires_permission_to_run": False,
+        "minibatch_size": 3,
+    },
+)
+def compile_mipro(student, trainset, metric, num_threads, init, compile):
+    import dspy
+    from dspy.teleprompt import MIPROv2
+
+    mipro = MIPROv2(
+        prompt_model=dspy.settings.lm,
+        task_model=dspy.settings.lm,
+        metric=metric,
+        num_threads=num_threads,
+        **init
+    )
+    return mipro.compile(student=student, trainset=trainset, **compile)
+
+
+@register_optimizer(
+    "simba", "optimized_rag_simba.json",
+    init={
+        "bsize": 2,
+        "num_candidates": 2,
+        "max_steps": 2,
+        "max_demos": 1,
+        "temperature_for_sampling": 0.3,
+        "temperature_for_candidates": 0.3,
+    },
+)
+def compile_simba(student, trainset, metric, num_threads, init, compile):
+    import dspy
+    from dspy.teleprompt import SIMBA
+
+    simba = SIMBA(metric=metric, prompt_model=dspy.settings.lm, num_threads=num_threads, **init)
+    return simba.compile(student=student, trainset=trainset, **compile)
+
+
+_langfuse_client = None
+_initialized = False
+
+
+def initialize():
+    """Tracing and the LM, set up once on the first run."""
+    global _langfuse_client, _initialized
+    if not _initialized:
+        from dspy_config import configure_lm
+        from langfuse_config import setup_langfuse
+        from tracing_config import setup_mlflow_tracing
+
+        setup_mlflow_tracing()
+        configure_lm(rate_profile="optimization")
+        _langfuse_client = setup_langfuse()
+        _initialized = True
+    return _langfuse_client
+
+
+def make_tracked_metric(metric, kind):
+    """Wrap metric so every call is a Langfuse span with its score and tokens.
+
+    GEPA metrics return a Prediction with score and feedback, the others
+    a float.
+    """
+    import dspy
+    from langfuse import observe, propagate_attributes
+
+    @observe(name="Evaluate_Single_Example")
+    def tracked_metric(gold, pred, trace=None, pred_name=None, pred_trace=None):
+        if kind == "gepa":
+            result = metric(gold, pred, trace=trace, pred_name=pred_name, pred_trace=pred_trace)
+            score, feedback = result["score"], result["feedback"]
+        else:
+            score, feedback = metric(gold, pred, trace), None
+
+        lm_usage = pred.get_lm_usage() if hasattr(pred, "get_lm_usage") else {}
+        with propagate_attributes(
+            metadata={
+                "question": gold.question[:100] if hasattr(gold, "question") else None,
+                "score": str(score),
+                "feedback": feedback,
+                "pred_name": pred_name,
+                **extract_token_summary(lm_usage),
+            }
+        ):
+            pass
+
+        if kind == "gepa":
+            return dspy.Prediction(score=score, feedback=feedback)
+        return score
+
+    return tracked_metric
+
+
+def score_only(metric):
+    def scored(gold, pred, trace=None):
+        result = metric(gold, pred, trace)
+        return getattr(result, "score", result)
+    return scored
+
+
+def write_report(report, report_dir):
+    os.makedirs(report_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(report_dir, f"{report['optimizer']}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
+
+
+def run_optimizer(name, num_threads=None, budget=None, evaluate=True, report_dir=None):
+    """Compile, save and evaluate one registered optimizer; return its report.
+
+    Every run writes a report, failed ones included. When the budget runs
+    out during compilation the best candidate scored so far is saved
+    instead and the final evaluation is skipped; when it runs out during
+    evaluation the program is kept but no score is reported.
+    """
+    from langfuse import observe, propagate_attributes
+
+    if name not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer {name!r}, expected one of {sorted(OPTIMIZERS)}")
+    spec = OPTIMIZERS[name]
+    settings = get_optimizer_settings()
+    config = get_optimizer_config()
+    overrides = config["optimizers"].get(name, {})
+    num_threads = num_threads or settings["num_threads"]
+    budget = budget or Budget.from_config(config["budget"])
+    init = {**spec.init, **overrides.get("init", {})}
+    compile = {**spec.compile, **overrides.get("compile", {})}
+    train_size = overrides.get("train_size", spec.train_size)
+    eval_size = overrides.get("eval_size", spec.eval_size)
+
+    langfuse_client = initialize()
+
+    @observe(name=f"{name.upper()}_Optimization_Full")
+    def run():
+        import dspy
+        from dspy.evaluate import Evaluate
+        from budget_controller import BudgetController, program_fingerprint
+        from dspy_config import lm_meter
+        from dspy_rag import RAGModule
+
+        examples = TRAINSETS[spec.trainset]()
+        student = RAGModule()
+        seed_fingerprint = program_fingerprint(student)
+        controller = BudgetController(
+            budget, lm_meter, RAGModule,
+            devset_size=len(examples[:train_size]),
+            min_examples=settings["min_best_examples"],
+        )
+        metric = in_current_context(
+            controller.wrap_metric(make_tracked_metric(make_metric(spec.metric), spec.metric))
+        )
+        report = {
+            "optimizer": name,
+            "status": "started",
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "model": str(dspy.settings.lm.model),
+            "num_threads": num_threads,
+            "train_size": len(examples[:train_size]),
+            "eval_size": len(examples[:eval_size]),
+            "init": init,
+            "compile": compile,
+            "budget": budget.as_dict(),
+            "budget_exceeded": [],
+            "score": None,
+            "saved_to": None,
+        }
+
+        lm_meter.reset()
+        with propagate_attributes(
+            tags=["optimization", name, "training"],
+            metadata={"optimizer": name, "model": report["model"], "num_threads": str(num_threads)},
+            version="1.0.0",
+        ), controller, dspy.context(callbacks=[*dspy.settings.callbacks, controller]):
+            started_at = datetime.now()
+            start = time.time()
+            try:
+                program = spec.compile_fn(
+                    student, examples[:train_size], metric, num_threads, init, compile
+                )
+            except Exception as e:
+                program = None
+                if not controller.stopped:
+                    report.update(status="failed", error=str(e))
+            report["compile_seconds"] = round(time.time() - start, 2)
+            report["compile_usage"] = lm_meter.snapshot()
+
+            if controller.stopped:
+                # whatever the optimizer returned was picked from evaluations
+                # the budget cut short, so keep the best candidate it scored
+                program, fingerprint, best_score, examples_scored = controller.best()
+                report.update(
+                    status="stopped_early",
+                    budget_exceeded=controller.stopped_by,
+                    best_compile_score=best_score,
+                    best_compile_examples=examples_scored,
+                )
+                if fingerprint == seed_fingerprint:
+                    # nothing beat the seed; keep the previously optimized file
+                    report["best_is_seed"] = True
+                    program = None
+            if program is None:
+                return finish(report, start)
+
+            program.save(spec.output_path)
+            report["saved_to"] = spec.output_path
+            if spec.on_complete is not None:
+                spec.on_complete(program, started_at)
+
+            if evaluate and not controller.stopped:
+                eval_start = time.time()
+                evaluator = Evaluate(
+                    devset=examples[:eval_size],
+                    metric=score_only(metric),
+                    num_threads=num_threads,
+                    display_progress=True,
+                    display_table=True,
+                )
+                try:
+                    result = evaluator(program)
+                except Exception as e:
+                    result = None
+                    if not controller.stopped:
+                        report.update(status="failed", error=str(e))
+                report["eval_seconds"] = round(time.time() - eval_start, 2)
+                if controller.stopped:
+                    # failed examples would drag the score down; don't report one
+                    report.update(status="stopped_early", budget_exceeded=controller.stopped_by)
+                elif result is not None:
+                    report["score"] = getattr(result, "score", result)
+
+            if report["status"] == "started":
+                report["status"] = "complete"
+            return finish(report, start)
+
+    def finish(report, start):
+        from dspy_config import lm_meter
+        from judge_cache import get_judge_cache
+        from rate_limit import get_lm_limiter
+
+        report["duration_seconds"] = round(time.time() - start, 2)
+        report.update(lm_meter.snapshot())
+        report["judge_cache"] = get_judge_cache().stats()
+        report["rate_limiter"] = get_lm_limiter("optimization").stats()
+        if langfuse_client:
+            langfuse_client.update_current_trace(
+                output={key: str(value) for key, value in report.items()}
+            )
+        return report
+
+    report = run()
+
+    report["report_path"] = write_report(report, report_dir or settings["report_dir"])
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run DSPy optimizers on the RAG module")
+    parser.add_argument("optimizers", nargs="*", help=f"one or more of {sorted(OPTIMIZERS)}")
+    parser.add_argument("--list", action="store_true", help="list registered optimizers and exit")
+    parser.add_argument("--num-threads", type=int, default=None,
+                        help="parallel program and judge calls (default: OPTIMIZER_NUM_THREADS)")
+    parser.add_argument("--max-lm-calls", type=int, default=None)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--no-eval", action="store_true", help="skip the final evaluation")
+    parser.add_argument("--report-dir", default=None,
+                        help="where run reports are written (default: OPTIMIZER_REPORT_DIR)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.list or not args.optimizers:
+        for name, spec in sorted(OPTIMIZERS.items()):
+            print(f"{name}: {spec.output_path} (metric={spec.metric}, trainset={spec.trainset})")
+        return []
+
+    budget = Budget.from_config(
+        get_optimizer_config()["budget"],
+        max_lm_calls=args.max_lm_calls,
+        max_tokens=args.max_tokens,
+        max_seconds=args.max_seconds,
+    )
+    reports = []
+    for name in args.optimizers:
+        report = run_optimizer(
+            name,
+            num_threads=args.num_threads,
+            budget=budget,
+            evaluate=not args.no_eval,
+            report_dir=args.report_dir,
+        )
+        if report["status"] == "failed":
+            print(f"{name} failed: {report['error']}")
+        elif report["budget_exceeded"]:
+            print(f"{name} stopped by budget ({', '.join(report['budget_exceeded'])}), saved: {report['saved_to']}")
+        print(f"{name}: score={report['score']} seconds={report['duration_seconds']} "
+              f"calls={report['lm_calls']} tokens={report['total_tokens']}")
+        print(f"Judge cache: {report['judge_cache']}")
+        print(f"Report: {report['report_path']}")
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    main()
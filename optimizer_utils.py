@@ -0,0 +1,58 @@
+import contextvars
+import functools
+
+
+def extract_token_summary(lm_usage):
+    """Sum a prediction's per-model usage into strings for Langfuse metadata."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for _, stats in (lm_usage or {}).items():
+        for key in totals:
+            totals[key] += stats.get(key, 0) or 0
+    return {key: str(value) for key, value in totals.items()}
+
+
+def in_current_context(fn):
+    """Run fn in a copy of the caller's context from any thread.
+
+    Optimizer worker threads start with an empty context, so Langfuse
+    spans opened by a metric would become separate traces. Wrapping the
+    metric inside the run's @observe function keeps them under it. Each
+    call gets its own copy because a context cannot be entered by two
+    threads at once.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class Budget:
+    """Limits for one optimizer run; None means unlimited."""
+
+    LIMITS = ("max_lm_calls", "max_tokens", "max_seconds")
+
+    def __init__(self, max_lm_calls=None, max_tokens=None, max_seconds=None):
+        self.max_lm_calls = max_lm_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        limits = {name: config.get(name) for name in cls.LIMITS}
+        limits.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**limits)
+
+    def exceeded(self, usage, elapsed):
+        """Names of the limits that usage and elapsed seconds have reached."""
+        checks = (
+            ("max_lm_calls", self.max_lm_calls, usage["lm_calls"]),
+            ("max_tokens", self.max_tokens, usage["total_tokens"]),
+            ("max_seconds", self.max_seconds, elapsed),
+        )
+        return [name for name, limit, value in checks if limit and value >= limit]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.LIMITS}
@@ -0,0 +1,117 @@
+import json
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from sqlalchemy import text
+
+PARENT_TABLE = "rag_parent_documents"
+
+
+def ensure_parent_table(engine):
+    """Create the table holding parent sections for small-to-big retrieval."""
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {PARENT_TABLE} (
+                id TEXT NOT NULL,
+                collection_name TEXT NOT NULL,
+                source TEXT,
+                document TEXT NOT NULL,
+                cmetadata JSONB,
+                PRIMARY KEY (collection_name, id)
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS {PARENT_TABLE}_source_idx
+            ON {PARENT_TABLE} (collection_name, source)
+        """))
+
+
+def split_children(parents, chunk_size, chunk_overlap):
+    """Split each parent into small child chunks that point back to it.
+
+    Parents must already carry a parent_id in their metadata.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    children = []
+    for parent in parents:
+        for piece in splitter.split_text(parent.page_content):
+            children.append(Document(page_content=piece, metadata=dict(parent.metadata)))
+    return children
+
+
+def store_parents(engine, collection_name, source, parents, tenant=None):
+    """Make the table hold exactly these parents for one source and tenant."""
+    rows = [
+        {
+            "id": p.metadata["parent_id"],
+            "collection": collection_name,
+            "source": source,
+            "document": p.page_content,
+            "cmetadata": json.dumps(p.metadata),
+        }
+        for p in parents
+    ]
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            DELETE FROM {PARENT_TABLE}
+            WHERE collection_name = :collection AND source = :source
+              AND cmetadata->>'tenant' IS NOT DISTINCT FROM :tenant
+              AND NOT (id = ANY(CAST(:ids AS TEXT[])))
+        """), {
+            "collection": collection_name,
+            "source": source,
+            "tenant": tenant,
+            "ids": [r["id"] for r in rows],
+        })
+        if rows:
+            conn.execute(text(f"""
+                INSERT INTO {PARENT_TABLE} (id, collection_name, source, document, cmetadata)
+                VALUES (:id, :collection, :source, :document, CAST(:cmetadata AS JSONB))
+                ON CONFLICT (collection_name, id) DO NOTHING
+            """), rows)
+
+
+def fetch_parents(engine, collection_name, parent_ids):
+    """Load parents by id in one query. Returns {id: Document}."""
+    if not parent_ids:
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT id, document, cmetadata
+            FROM {PARENT_TABLE}
+            WHERE collection_name = :collection AND id = ANY(CAST(:ids AS TEXT[]))
+        """), {"collection": collection_name, "ids": list(parent_ids)}).all()
+    return {
+        row[0]: Document(id=row[0], page_content=row[1], metadata=row[2] or {})
+        for row in rows
+    }
+
+
+def expand_to_parents(engine, collection_name, docs, k):
+    """Replace matched child chunks with their parents, best match first.
+
+    docs must be in relevance order. Several children of one parent
+    collapse into a single parent, and chunks without a parent_id (or
+    whose parent is missing) are kept as they are. Returns at most k
+    documents, or docs[:k] unchanged if no chunk has a parent.
+    """
+    parent_ids = [d.metadata.get("parent_id") for d in docs]
+    if not any(parent_ids):
+        return docs[:k]
+
+    parents = fetch_parents(engine, collection_name, {p for p in parent_ids if p})
+
+    expanded = []
+    seen = set()
+    for doc, parent_id in zip(docs, parent_ids):
+        key = parent_id if parent_id in parents else id(doc)
+        if key in seen:
+            continue
+        seen.add(key)
+        expanded.append(parents.get(parent_id, doc))
+        if len(expanded) >= k:
+            break
+    return expanded
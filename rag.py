@@ -1,37 +1,65 @@
+import asyncio
+import functools
 import os
+import time
 import dspy
 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_postgres import PGVector
-
-from config import get_db_url, get_gemini_api_key
 from dspy_config import configure_lm
 from tracing_config import setup_mlflow_tracing
 from langfuse_config import setup_langfuse
 from dspy_rag import RAGModule
+from vector_store import get_registry, DEFAULT_EMBEDDING_MODEL
+from config import get_semantic_cache_settings, get_async_settings, get_retrieval_mode
+from hybrid_retrieval import HybridRetriever
+from context_assembly import assemble_context
+from reranking import rerank_documents, retrieval_depth, get_reranker
+from parent_documents import expand_to_parents
+from metadata_filters import filtered_similarity_search, afiltered_similarity_search
+from tenants import get_router, DEFAULT_COLLECTION
+from async_rag import AsyncRAGPipeline
+from diagnostics import (
+    setup_diagnostics,
+    log_event,
+    dump_last_prompt,
+    install_prompt_capture,
+    start_prompt_capture,
+)
 
 from langfuse import observe, propagate_attributes
 from feedback_store import get_today_thumbs_down
 from feedback_store import increment_thumbs_down
+from feedback_store import ensure_feedback_schema
 
 configure_lm()
 setup_mlflow_tracing()
+setup_diagnostics()
+install_prompt_capture(dspy.settings.lm)
 
 langfuse_client = setup_langfuse()
 
 rag_module = RAGModule()
 THUMBS_DOWN_THRESHOLD = 4
 
+try:
+    ensure_feedback_schema()
+except Exception as e:
+    # answering questions doesn't need the feedback schema; run
+    # python feedback_store.py to see and fix the problem
+    print(f"Feedback schema setup failed: {e}")
 thumbs_down_today = get_today_thumbs_down()
 
+LOADED_PROGRAM_PATH = None
+
 if thumbs_down_today >= THUMBS_DOWN_THRESHOLD and os.path.exists("optimized_rag_gepa.json"):
     rag_module.load("optimized_rag_gepa.json")
     CURRENT_OPTIMIZER = "GEPA"
+    LOADED_PROGRAM_PATH = "optimized_rag_gepa.json"
     print("GEPA enabled due to feedback threshold")
 else:
     if os.path.exists("optimized_rag.json"):
         rag_module.load("optimized_rag.json")
         CURRENT_OPTIMIZER = "Baseline"
+        LOADED_PROGRAM_PATH = "optimized_rag.json"
         print("Using baseline RAG")
     else:
         CURRENT_OPTIMIZER = "Baseline"
@@ -68,27 +96,137 @@ else:
 #     print("No optimized model found")
 
 
-COLLECTION_NAME = "sql_docs"
+COLLECTION_NAME = DEFAULT_COLLECTION
+
+
+def get_rag_components(k: int = 4, collection_name: str = COLLECTION_NAME):
+    registry = get_registry()
+    if get_retrieval_mode() == "hybrid":
+        return registry.get_hybrid_retriever(
+            collection_name,
+            k=k,
+            embedding_model=DEFAULT_EMBEDDING_MODEL
+        )
+    return registry.get_retriever(
+        collection_name,
+        k=k,
+        embedding_model=DEFAULT_EMBEDDING_MODEL
+    )
 
 
-def get_rag_components(k: int = 4):
-    db_url = get_db_url()
-    gemini_key = get_gemini_api_key()
+def retrieve_documents(retriever, question, k, query_embedding=None, filters=None):
+    """Run the retriever, reusing an already computed query embedding.
+
+    filters (see metadata_filters.filter_clause) are applied in SQL.
+    """
+    if isinstance(retriever, HybridRetriever):
+        return retriever.invoke(question, query_embedding=query_embedding, filters=filters)
+    if filters:
+        if query_embedding is None:
+            query_embedding = retriever.vectorstore.embeddings.embed_query(question)
+        return filtered_similarity_search(
+            get_registry().get_engine(),
+            retriever.vectorstore.collection_name,
+            query_embedding, k, filters
+        )
+    if query_embedding is not None:
+        return retriever.vectorstore.similarity_search_by_vector(
+            query_embedding, k=k
+        )
+    return retriever.invoke(question)
 
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="text-embedding-004",
-        google_api_key=gemini_key
+
+def hybrid_search(question, query_embedding, k, filters=None, collection_name=COLLECTION_NAME):
+    """Blocking hybrid retrieval for the async pipeline."""
+    retriever = get_registry().get_hybrid_retriever(
+        collection_name,
+        k=k,
+        embedding_model=DEFAULT_EMBEDDING_MODEL
     )
+    return retriever.invoke(question, query_embedding=query_embedding, filters=filters)
+
+
+def expand_parents(docs, k, collection_name=COLLECTION_NAME):
+    """Swap child chunks for their parent sections (one batched query)."""
+    return expand_to_parents(get_registry().get_engine(), collection_name, docs, k)
+
+
+def select_documents(question, docs, k, collection_name=COLLECTION_NAME):
+    """Rerank the candidates, then keep the best k distinct parents.
+
+    Every candidate stays ranked because several children may share a
+    parent; collections without parents simply keep the top k chunks.
+    """
+    docs, rerank_stats = rerank_documents(question, docs, top_n=len(docs))
+    return expand_parents(docs, k, collection_name), rerank_stats
+
 
-    vectorstore = PGVector(
-        connection=db_url,
-        embeddings=embeddings,
-        collection_name=COLLECTION_NAME,
-        use_jsonb=True
+def warm_up_retriever(k: int = 4):
+    registry = get_registry()
+    get_rag_components(k=k)
+    # load a cross-encoder now rather than inside the first request's budget
+    get_reranker()
+    registry.check_health()
+    return registry.pool_status()
+
+
+try:
+    print("Vector store pool:", warm_up_retriever())
+except Exception as e:
+    print(f"Vector store warm-up skipped: {e}")
+
+
+def release_tenant(tenant):
+    get_registry().release_collection(tenant.collection)
+
+
+def get_tenant(user_id=None, session_id=None):
+    """Route a request to its tenant and enforce the tenant's quota.
+
+    Raises tenants.TenantQuotaExceeded when the tenant is over its
+    request or token limit.
+    """
+    tenant = get_router(on_evict=release_tenant).route(user_id, session_id)
+    tenant.quota.check()
+    return tenant
+
+
+def program_version():
+    mtime = (
+        os.path.getmtime(LOADED_PROGRAM_PATH)
+        if LOADED_PROGRAM_PATH and os.path.exists(LOADED_PROGRAM_PATH)
+        else None
     )
+    return (CURRENT_OPTIMIZER, LOADED_PROGRAM_PATH, mtime)
+
+
+def refresh_cache_version(tenant):
+    """Clear a tenant's semantic cache when the program or its collection changed.
+
+    The collection fingerprint costs a query, so it is re-read at most
+    once per SEMANTIC_CACHE_VERSION_CHECK seconds per tenant.
+    """
+    now = time.monotonic()
+    interval = get_semantic_cache_settings()["version_check_interval"]
+    if now - tenant.cache_checked_at < interval:
+        return
+    tenant.cache_checked_at = now
+
+    try:
+        fingerprint = get_registry().collection_fingerprint(tenant.collection)
+    except Exception as e:
+        print(f"Semantic cache version check failed: {e}")
+        tenant.cache.invalidate()
+        return
+
+    tenant.cache.set_version((program_version(), tenant.collection, fingerprint))
 
-    retriever = vectorstore.as_retriever(search_kwargs={"k": k})
-    return retriever
+
+def cache_trace_metadata(cache, outcome):
+    metadata = {"semantic_cache": outcome}
+    for name, value in cache.stats().items():
+        metadata[f"semantic_cache_{name}"] = value
+    return metadata
 
 
 def extract_usage_stats(lm_usage):
@@ -113,79 +251,372 @@ def extract_usage_stats(lm_usage):
     }
 
 
-@observe(name="RAG_Query")
-def answer_question(
-    question: str,
-    k: int = 4,
-    user_id: str | None = None,
-    session_id: str | None = None
-):
-    with propagate_attributes(
+NO_CONTEXT_ANSWER = "No relevant context found."
+
+
+def trace_attributes(k, user_id, session_id, tenant, streaming=False, filters=None):
+    return dict(
         user_id=user_id or "anonymous",
         session_id=session_id or "default_session",
-        tags=["rag", "sql-assistant", f"optimizer-{CURRENT_OPTIMIZER}"],
+        tags=["rag", "sql-assistant", f"optimizer-{CURRENT_OPTIMIZER}"]
+        + (["streaming"] if streaming else []),
         metadata={
             "retrieval_k": k,
             "optimizer": CURRENT_OPTIMIZER,
-            "model": "gemini-2.5-flash"
+            "model": "gemini-2.5-flash",
+            "streaming": streaming,
+            "filters": filters or {},
+            "tenant": tenant.name,
+            "collection": tenant.collection
         },
         version="1.0.0"
-    ):
-        retriever = get_rag_components(k=k)
-        docs = retriever.invoke(question)
+    )
+
 
-        trace_id = (
-            langfuse_client.get_current_trace_id()
-            if langfuse_client else None
+def current_trace_id():
+    return (
+        langfuse_client.get_current_trace_id()
+        if langfuse_client else None
+    )
+
+
+def lookup_cached_answer(question, k, tenant, filters=None):
+    """Check the tenant's semantic cache and retrieve documents on a miss.
+
+    Returns (cache, query_embedding, cached, similarity, docs). cached is
+    set on a hit and docs on a miss. Questions with request filters
+    bypass the cache, which is keyed by the question alone; the tenant's
+    own filters are always applied.
+    """
+    # over-fetch so the reranker can choose the best k candidates
+    depth = retrieval_depth(k)
+    retriever = get_rag_components(k=depth, collection_name=tenant.collection)
+    cache = tenant.cache if not filters else None
+    filters = {**tenant.filters, **(filters or {})}
+
+    if cache is None:
+        return None, None, None, None, retrieve_documents(
+            retriever, question, depth, filters=filters
         )
 
-        if not docs:
-            if langfuse_client:
-                langfuse_client.update_current_trace(
-                    input={"question": question},
-                    output={"answer": "No relevant context found."}
+    refresh_cache_version(tenant)
+    query_embedding = retriever.vectorstore.embeddings.embed_query(question)
+    cached, similarity = cache.lookup(query_embedding, k=k, mode=get_retrieval_mode())
+
+    if cached is not None:
+        return cache, query_embedding, cached, similarity, None
+
+    # reuse the embedding computed for the cache lookup
+    docs = retrieve_documents(retriever, question, depth, query_embedding, filters)
+    return cache, query_embedding, None, similarity, docs
+
+
+def record_cache_hit(question, cache, cached, similarity):
+    if langfuse_client:
+        langfuse_client.update_current_trace(
+            input={"question": question},
+            output={
+                "answer": cached["answer"],
+                "num_sources": len(cached["sources"])
+            },
+            metadata={
+                **cache_trace_metadata(cache, "hit"),
+                "semantic_cache_similarity": round(similarity, 4)
+            }
+        )
+
+
+def record_no_context(question):
+    if langfuse_client:
+        langfuse_client.update_current_trace(
+            input={"question": question},
+            output={"answer": NO_CONTEXT_ANSWER}
+        )
+
+
+def finish_answer(question, answer, docs, context_list, usage, cache, query_embedding, k, mode):
+    """Record usage on the trace, fill the cache and build the sources."""
+    trace_id = current_trace_id()
+    log_event("rag_answer", trace_id=trace_id, num_context_docs=len(context_list), **usage)
+    dump_last_prompt(trace_id)
+
+    if langfuse_client:
+        langfuse_client.update_current_trace(
+            input={
+                "question": question,
+                "num_context_docs": len(context_list)
+            },
+            output={
+                "answer": answer,
+                "num_sources": len(docs),
+                "answer_length_chars": len(answer)
+            },
+            metadata={
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "total_tokens": usage["total_tokens"],
+                "context_tokens": usage.get("context_tokens"),
+                "context_tokens_saved": usage.get("context_tokens_saved"),
+                "rerank_ms": usage.get("rerank_ms"),
+                "rerank_fallback": usage.get("rerank_fallback"),
+                **(
+                    cache_trace_metadata(cache, "miss")
+                    if cache is not None else {}
                 )
-            return "No relevant context found.", []
+            }
+        )
+
+    sources = [
+        (d.metadata.get("source", "unknown"), d.metadata.get("page", "?"))
+        for d in docs
+    ]
 
-        context_list = [d.page_content for d in docs]
+    if cache is not None:
+        cache.store(query_embedding, {
+            "answer": answer,
+            "sources": sources,
+            "context": context_list
+        }, k=k, mode=mode)
 
+    return sources
+
+
+@observe(name="RAG_Query")
+def answer_question(
+    question: str,
+    k: int = 4,
+    user_id: str | None = None,
+    session_id: str | None = None,
+    filters: dict | None = None
+):
+    tenant = get_tenant(user_id, session_id)
+    with propagate_attributes(**trace_attributes(k, user_id, session_id, tenant, filters=filters)):
+        trace_id = current_trace_id()
+        cache, query_embedding, cached, similarity, docs = lookup_cached_answer(
+            question, k, tenant, filters
+        )
+
+        if cached is not None:
+            record_cache_hit(question, cache, cached, similarity)
+            return (
+                cached["answer"],
+                cached["sources"],
+                trace_id,
+                cached["context"]
+            )
+
+        if not docs:
+            record_no_context(question)
+            return NO_CONTEXT_ANSWER, [], trace_id, []
+
+        docs, rerank_stats = select_documents(question, docs, k, tenant.collection)
+        docs, context_list, context_stats = assemble_context(docs)
+        context_stats.update(rerank_stats)
+
+        start_prompt_capture()
         prediction = rag_module(
             context=context_list,
             question=question
         )
 
-        lm_usage = prediction.get_lm_usage()
-        usage = extract_usage_stats(lm_usage)
-
-        dspy.inspect_history(n=1)
-        print("Token usage:", usage)
-
-        if langfuse_client:
-            langfuse_client.update_current_trace(
-                input={
-                    "question": question,
-                    "num_context_docs": len(context_list)
-                },
-                output={
-                    "answer": prediction.answer,
-                    "num_sources": len(docs),
-                    "answer_length_chars": len(prediction.answer)
-                },
-                metadata={
-                    "prompt_tokens": usage["prompt_tokens"],
-                    "completion_tokens": usage["completion_tokens"],
-                    "total_tokens": usage["total_tokens"]
-                }
-            )
-
-        sources = [
-            (d.metadata.get("source", "unknown"), d.metadata.get("page", "?"))
-            for d in docs
-        ]
+        usage = {**extract_usage_stats(prediction.get_lm_usage()), **context_stats}
+        tenant.quota.charge(usage["total_tokens"])
+        sources = finish_answer(
+            question, prediction.answer, docs, context_list,
+            usage, cache, query_embedding, k, get_retrieval_mode()
+        )
 
         return prediction.answer, sources, trace_id, context_list
 
-    
+
+class StreamingAnswer:
+    """Iterate to receive answer tokens; the rest is filled in at the end.
+
+    answer, sources, trace_id, context and usage are only set once the
+    token stream has been fully consumed.
+    """
+
+    def __init__(self):
+        self.answer = None
+        self.sources = []
+        self.trace_id = None
+        self.context = []
+        self.usage = extract_usage_stats(None)
+        self._tokens = iter(())
+
+    def __iter__(self):
+        return self._tokens
+
+
+_streaming_rag = None
+
+
+def get_streaming_rag():
+    global _streaming_rag
+    if _streaming_rag is None:
+        _streaming_rag = dspy.streamify(
+            rag_module,
+            stream_listeners=[
+                dspy.streaming.StreamListener(signature_field_name="answer")
+            ],
+            async_streaming=False
+        )
+    return _streaming_rag
+
+
+@observe(name="RAG_Query")
+def _stream_answer(result, question, k, user_id, session_id, tenant, filters):
+    with propagate_attributes(
+        **trace_attributes(k, user_id, session_id, tenant, streaming=True, filters=filters)
+    ):
+        result.trace_id = current_trace_id()
+        cache, query_embedding, cached, similarity, docs = lookup_cached_answer(
+            question, k, tenant, filters
+        )
+
+        if cached is not None:
+            record_cache_hit(question, cache, cached, similarity)
+            result.answer = cached["answer"]
+            result.sources = cached["sources"]
+            result.context = cached["context"]
+            yield cached["answer"]
+            return
+
+        if not docs:
+            record_no_context(question)
+            result.answer = NO_CONTEXT_ANSWER
+            yield NO_CONTEXT_ANSWER
+            return
+
+        docs, rerank_stats = select_documents(question, docs, k, tenant.collection)
+        docs, context_list, context_stats = assemble_context(docs)
+        context_stats.update(rerank_stats)
+        prediction = None
+        streamed = []
+
+        start_prompt_capture()
+        for chunk in get_streaming_rag()(context=context_list, question=question):
+            if isinstance(chunk, dspy.streaming.StreamResponse):
+                streamed.append(chunk.chunk)
+                yield chunk.chunk
+            elif isinstance(chunk, dspy.Prediction):
+                prediction = chunk
+
+        answer = prediction.answer if prediction is not None else "".join(streamed)
+        if not streamed:
+            # the LM answered without streaming (e.g. a cached LM response)
+            yield answer
+
+        usage = {
+            **extract_usage_stats(
+                prediction.get_lm_usage() if prediction is not None else None
+            ),
+            **context_stats
+        }
+        tenant.quota.charge(usage["total_tokens"])
+        result.sources = finish_answer(
+            question, answer, docs, context_list,
+            usage, cache, query_embedding, k, get_retrieval_mode()
+        )
+        result.answer = answer
+        result.context = context_list
+        result.usage = usage
+
+
+def answer_question_stream(
+    question: str,
+    k: int = 4,
+    user_id: str | None = None,
+    session_id: str | None = None,
+    filters: dict | None = None
+) -> StreamingAnswer:
+    # route and check the quota now, not on the first token
+    tenant = get_tenant(user_id, session_id)
+    result = StreamingAnswer()
+    result._tokens = _stream_answer(result, question, k, user_id, session_id, tenant, filters)
+    return result
+
+
+def get_async_pipeline(tenant):
+    """The tenant's async pipeline; each tenant has its own concurrency limit."""
+    if tenant.async_pipeline is None:
+        registry = get_registry()
+        tenant.async_pipeline = AsyncRAGPipeline(
+            program=rag_module,
+            embeddings=registry.get_embeddings(DEFAULT_EMBEDDING_MODEL),
+            vectorstore=registry.get_async_vectorstore(tenant.collection),
+            max_concurrency=get_async_settings()["max_concurrency"],
+            cache=tenant.cache,
+            context_assembler=assemble_context,
+            reranker=rerank_documents,
+            retrieval_depth=retrieval_depth,
+            parent_expander=functools.partial(
+                expand_parents, collection_name=tenant.collection
+            ),
+            filtered_search=functools.partial(
+                afiltered_similarity_search,
+                registry.get_async_engine(),
+                tenant.collection
+            ),
+            # RAG_RETRIEVAL_MODE=hybrid has no async full-text search, so the
+            # sync HybridRetriever runs in a worker thread
+            hybrid_search=functools.partial(
+                hybrid_search, collection_name=tenant.collection
+            ) if get_retrieval_mode() == "hybrid" else None
+        )
+    return tenant.async_pipeline
+
+
+@observe(name="RAG_Query")
+async def answer_question_async(
+    question: str,
+    k: int = 4,
+    user_id: str | None = None,
+    session_id: str | None = None,
+    filters: dict | None = None
+):
+    """Async counterpart of answer_question with the same return value."""
+    tenant = get_tenant(user_id, session_id)
+    with propagate_attributes(**trace_attributes(k, user_id, session_id, tenant, filters=filters)):
+        trace_id = current_trace_id()
+        pipeline = get_async_pipeline(tenant)
+        cache = pipeline.cache if not filters else None
+
+        if cache is not None:
+            await asyncio.to_thread(refresh_cache_version, tenant)
+
+        start_prompt_capture()
+        result = await pipeline.answer(
+            question, k=k, filters={**tenant.filters, **(filters or {})},
+            use_cache=cache is not None
+        )
+
+        if result["cache_similarity"] is not None:
+            cached = {
+                "answer": result["answer"],
+                "sources": result["sources"],
+                "context": result["context"]
+            }
+            record_cache_hit(question, cache, cached, result["cache_similarity"])
+            return result["answer"], result["sources"], trace_id, result["context"]
+
+        if not result["docs"]:
+            record_no_context(question)
+            return NO_CONTEXT_ANSWER, [], trace_id, []
+
+        usage = {
+            **extract_usage_stats(result["prediction"].get_lm_usage()),
+            **result["context_stats"]
+        }
+        tenant.quota.charge(usage["total_tokens"])
+        sources = finish_answer(
+            question, result["answer"], result["docs"], result["context"],
+            usage, cache, result["query_embedding"], k, pipeline.retrieval_mode
+        )
+
+        return result["answer"], sources, trace_id, result["context"]
+
+
 def log_feedback(trace_id: str, score: int):
     if not langfuse_client or not trace_id:
         return
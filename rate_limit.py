@@ -0,0 +1,257 @@
+import asyncio
+import random
+import re
+import threading
+import time
+
+from config import get_lm_rate_settings
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Take amount now (possibly going negative) and return seconds to wait.
+
+        Requests larger than the capacity are allowed but pay for the
+        deficit with a proportionally longer wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def try_acquire(self, amount=1):
+        """Take amount only if it is available now.
+
+        Returns 0.0 on success, otherwise the seconds until it would be.
+        Nothing is taken on failure.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate_per_second
+
+    def acquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateBudget:
+    """Requests-per-minute and tokens-per-minute limits shared by threads.
+
+    A limit of 0 or None disables that dimension.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens=0):
+        """Take one request and tokens now; return seconds to wait."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens=0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def refund(self, tokens=0):
+        """Give back a reservation that turned out not to be needed."""
+        if self.requests is not None:
+            self.requests.reserve(-1)
+        if self.tokens is not None and tokens:
+            self.tokens.reserve(-tokens)
+
+
+class LMRateLimitExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LM rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text):
+    # Gemini averages roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+
+RETRY_DELAY = re.compile(r"retry[_ ]?delay\W*(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def is_rate_limit_error(error):
+    status = getattr(error, "status_code", None)
+    if status in (429, 503):
+        return True
+    name = type(error).__name__
+    if name in ("RateLimitError", "ServiceUnavailableError"):
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def retry_after_seconds(error):
+    """Server-suggested delay from a Retry-After header or Gemini's retryDelay."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    match = RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class AdaptiveRateLimiter:
+    """Shared RPM/TPM budget for LM calls that adapts to 429 responses.
+
+    Every call first waits for the token buckets. A rate-limit error
+    pauses all callers until the server's Retry-After (or an exponential
+    backoff) has passed and halves the bucket rates; each successful call
+    then adds back a twentieth of the configured rate. Safe to use from
+    many threads and from asyncio.
+
+    A call that would have to wait longer than max_wait_seconds raises
+    LMRateLimitExceeded instead of sleeping; None waits as long as needed.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=5, backoff_seconds=2.0, min_rate_fraction=0.1,
+                 max_wait_seconds=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.budget = RateBudget(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.min_rate_fraction = min_rate_fraction
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._fraction = 1.0
+        self._stats = {"calls": 0, "rate_limited": 0, "retries": 0, "rejected": 0,
+                       "waited_seconds": 0.0}
+
+    def _scale(self, fraction):
+        self._fraction = fraction
+        for bucket, per_minute in (
+            (self.budget.requests, self.requests_per_minute),
+            (self.budget.tokens, self.tokens_per_minute),
+        ):
+            if bucket is not None:
+                bucket.rate_per_second = per_minute * fraction / 60.0
+
+    def _wait_time(self, tokens):
+        with self._lock:
+            blocked = max(0.0, self._blocked_until - time.monotonic())
+        wait = max(blocked, self.budget.reserve(tokens))
+        if self.max_wait_seconds is not None and wait > self.max_wait_seconds:
+            self.budget.refund(tokens)
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise LMRateLimitExceeded(wait)
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["waited_seconds"] += wait
+        return wait
+
+    def _succeeded(self):
+        with self._lock:
+            if self._fraction < 1.0:
+                self._scale(min(1.0, self._fraction + 0.05))
+
+    def _rate_limited(self, error, attempt):
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = self.backoff_seconds * (2 ** attempt)
+            delay += random.uniform(0, delay / 2)
+        with self._lock:
+            self._stats["rate_limited"] += 1
+            self._stats["retries"] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._scale(max(self.min_rate_fraction, self._fraction / 2))
+        print(f"LM rate limited ({type(error).__name__}); retrying in {delay:.1f}s")
+
+    def charge(self, tokens):
+        """Count tokens used beyond the estimate taken before the call."""
+        if self.budget.tokens is not None and tokens > 0:
+            self.budget.tokens.reserve(tokens)
+
+    def refund(self, tokens=0):
+        """Return the request and tokens reserved for a call that cost nothing."""
+        self.budget.refund(tokens)
+
+    def call(self, fn, tokens=0):
+        for attempt in range(self.max_retries + 1):
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                self._rate_limited(e, attempt)
+                continue
+            self._succeeded()
+            return result
+
+    async def acall(self, fn, tokens=0):
+        for attempt in range(self.max_retries + 1):
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                result = await fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                self._rate_limited(e, attempt)
+                continue
+            self._succeeded()
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["rate_fraction"] = round(self._fraction, 3)
+        stats["waited_seconds"] = round(stats["waited_seconds"], 2)
+        return stats
+
+
+_lm_limiters = {}
+_lm_limiter_lock = threading.Lock()
+
+
+def get_lm_limiter(profile="serving"):
+    """The process-wide limiter for profile, shared by every LM and judge call."""
+    with _lm_limiter_lock:
+        if profile not in _lm_limiters:
+            _lm_limiters[profile] = AdaptiveRateLimiter(**get_lm_rate_settings(profile))
+        return _lm_limiters[profile]
@@ -0,0 +1,145 @@
+import math
+import re
+import threading
+import time
+
+from config import get_rerank_settings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalOverlapReranker:
+    """Scores chunks by IDF-weighted overlap with the question's terms.
+
+    IDF is computed over the candidate set itself, so rare terms such as
+    COALESCE outweigh words every chunk shares. No model, microseconds
+    per chunk.
+    """
+
+    name = "lexical"
+
+    def score(self, question, texts):
+        query_terms = set(tokenize(question))
+        doc_terms = [set(tokenize(t)) for t in texts]
+        n = len(texts)
+        idf = {
+            term: math.log(1 + n / (1 + sum(term in terms for terms in doc_terms)))
+            for term in query_terms
+        }
+        total = sum(idf.values()) or 1.0
+        return [
+            sum(idf[term] for term in query_terms & terms) / total
+            for terms in doc_terms
+        ]
+
+
+class CrossEncoderReranker:
+    """Local CPU cross-encoder scoring (question, chunk) pairs in batches.
+
+    Needs the optional sentence-transformers package. backend="onnx"
+    runs the exported ONNX model through onnxruntime.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name, backend="torch", batch_size=32):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError(
+                "RAG_RERANKER=cross-encoder requires sentence-transformers "
+                "(pip install sentence-transformers, plus onnxruntime for the onnx backend)"
+            )
+        kwargs = {"device": "cpu"}
+        if backend != "torch":
+            kwargs["backend"] = backend
+        self.model = CrossEncoder(model_name, **kwargs)
+        self.batch_size = batch_size
+
+    def score(self, question, texts):
+        pairs = [(question, t) for t in texts]
+        return [float(s) for s in self.model.predict(pairs, batch_size=self.batch_size)]
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Return the configured reranker, or None when RAG_RERANKER=none."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            settings = get_rerank_settings()
+            if settings["reranker"] == "none":
+                return None
+            if settings["reranker"] == "lexical":
+                _reranker = LexicalOverlapReranker()
+            elif settings["reranker"] == "cross-encoder":
+                _reranker = CrossEncoderReranker(
+                    settings["model"],
+                    backend=settings["backend"],
+                    batch_size=settings["batch_size"]
+                )
+            else:
+                raise ValueError("RAG_RERANKER must be 'none', 'lexical' or 'cross-encoder'")
+        return _reranker
+
+
+def retrieval_depth(k):
+    """How many candidates to retrieve so the reranker can pick the best k."""
+    if get_reranker() is None:
+        return k
+    return max(k, get_rerank_settings()["fetch_k"])
+
+
+def rerank_documents(question, docs, top_n):
+    """Reorder docs by reranker score and keep top_n.
+
+    Scoring runs in the caller's thread, batch by batch, and the elapsed
+    time is checked after every batch: once RAG_RERANK_BUDGET_MS has
+    passed, the scores so far are dropped and the original vector order
+    is used instead, even if the last batch had just finished. Batched
+    rerankers get at least four batches per request, so the budget is
+    checked before the whole candidate set has been scored. No work is
+    left running after a fallback. Returns (docs, stats).
+    """
+    reranker = get_reranker()
+    if reranker is None or len(docs) <= 1:
+        return docs[:top_n], {"rerank_ms": 0.0, "rerank_fallback": False}
+
+    deadline_ms = get_rerank_settings()["budget_ms"]
+    start = time.perf_counter()
+    texts = [d.page_content for d in docs]
+    # lexical IDF is computed over the whole candidate set, so only
+    # rerankers with independent per-pair scores are split up
+    batch_size = getattr(reranker, "batch_size", None)
+    if batch_size:
+        batch_size = max(1, min(batch_size, math.ceil(len(texts) / 4)))
+    else:
+        batch_size = len(texts)
+
+    def elapsed_ms():
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    def fallback():
+        return docs[:top_n], {"rerank_ms": elapsed_ms(), "rerank_fallback": True}
+
+    scores = []
+    try:
+        for i in range(0, len(texts), batch_size):
+            scores.extend(reranker.score(question, texts[i:i + batch_size]))
+            if elapsed_ms() > deadline_ms:
+                return fallback()
+    except Exception as e:
+        print(f"Reranking failed, using vector order: {e}")
+        return fallback()
+    # stable sort keeps the retrieval order among equal scores
+    order = sorted(range(len(docs)), key=lambda i: -scores[i])
+    return [docs[i] for i in order[:top_n]], {
+        "rerank_ms": elapsed_ms(),
+        "rerank_fallback": False,
+    }
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    """LRU/TTL cache of answers keyed by question embedding.
+
+    A lookup returns the entry whose question embedding has the highest
+    cosine similarity to the new one, provided it clears the threshold.
+    Every entry is tagged with a version (loaded program + collection
+    fingerprint); when the version changes the cache is cleared. Entries
+    also record the k and retrieval mode they were answered with, and a
+    lookup only matches entries with the same k and mode.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._version = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def lookup(self, embedding, k=None, mode=None):
+        query = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            expired = [
+                key for key, entry in self._entries.items()
+                if now - entry["created_at"] > self.ttl_seconds
+            ]
+            for key in expired:
+                del self._entries[key]
+                self._stats["evictions"] += 1
+
+            best_key, best_score = None, -1.0
+            for key, entry in self._entries.items():
+                if entry["k"] != k or entry["mode"] != mode:
+                    continue
+                score = float(np.dot(query, entry["embedding"]))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None, best_score
+
+            self._entries.move_to_end(best_key)
+            self._stats["hits"] += 1
+            return self._entries[best_key]["value"], best_score
+
+    def store(self, embedding, value, k=None, mode=None):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "embedding": self._normalize(embedding),
+                "k": k,
+                "mode": mode,
+                "value": value,
+                "created_at": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
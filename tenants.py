@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from config import get_tenant_settings, get_semantic_cache_settings
+from rate_limit import TokenBucket
+from semantic_cache import SemanticCache
+
+DEFAULT_TENANT = "default"
+DEFAULT_COLLECTION = "sql_docs"
+
+
+class TenantQuotaExceeded(Exception):
+    def __init__(self, tenant, retry_after):
+        super().__init__(
+            f"Tenant {tenant!r} is over its quota, retry in {retry_after:.1f}s"
+        )
+        self.tenant = tenant
+        self.retry_after = retry_after
+
+
+class TenantQuota:
+    """Per-tenant requests-per-minute and tokens-per-minute limits.
+
+    Unlike RateBudget this never waits: a request over the limit is
+    rejected, so one busy tenant cannot hold up the others. Tokens are
+    only known after the answer, so they are charged afterwards and a
+    tenant in token debt is rejected until its bucket refills.
+    """
+
+    def __init__(self, tenant, requests_per_minute=None, tokens_per_minute=None):
+        self.tenant = tenant
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def check(self):
+        if self.tokens is not None:
+            wait = self.tokens.try_acquire(0)
+            if wait:
+                raise TenantQuotaExceeded(self.tenant, wait)
+        if self.requests is not None:
+            wait = self.requests.try_acquire(1)
+            if wait:
+                raise TenantQuotaExceeded(self.tenant, wait)
+
+    def charge(self, tokens):
+        if self.tokens is not None and tokens:
+            self.tokens.reserve(tokens)
+
+
+class TenantContext:
+    """Everything one tenant's questions need: collection, cache and quota."""
+
+    def __init__(self, name, collection, quota, cache=None, filters=None):
+        self.name = name
+        self.collection = collection
+        self.quota = quota
+        self.cache = cache
+        self.filters = filters or {}
+        self.cache_checked_at = 0.0
+        self.async_pipeline = None
+
+
+def load_tenant_config(path):
+    """Read the tenants file; a missing file means a single default tenant.
+
+    Format: {"default": {...}, "tenants": {"name": {"collection": ...,
+    "users": [...], "sessions": [...], "requests_per_minute": ...,
+    "tokens_per_minute": ..., "filters": {...}}}}
+    """
+    if not os.path.exists(path):
+        return {"default": {}, "tenants": {}}
+    with open(path) as f:
+        config = json.load(f)
+    config.setdefault("default", {})
+    config.setdefault("tenants", {})
+    return config
+
+
+class TenantRouter:
+    """Maps user_id/session_id to a tenant and keeps its resources.
+
+    At most max_active_tenants contexts are kept; the least recently used
+    one is dropped together with its retrievers and cache, but its quota
+    is kept. Each tenant's
+    semantic cache gets an equal share of cache_total_entries, so total
+    cache memory stays bounded however many tenants there are.
+    """
+
+    def __init__(self, config, max_active_tenants=16, cache_total_entries=2048,
+                 requests_per_minute=60, tokens_per_minute=200000, on_evict=None):
+        self.config = config
+        self.max_active_tenants = max(1, max_active_tenants)
+        self.cache_entries = max(1, cache_total_entries // self.max_active_tenants)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._contexts = OrderedDict()
+        # quotas outlive evictions, or a tenant could reset its buckets by
+        # getting itself evicted; each is only a few floats
+        self._quotas = {}
+
+        self._users = {}
+        self._sessions = {}
+        for name, tenant in config["tenants"].items():
+            for user in tenant.get("users", []):
+                self._users[user] = name
+            for session in tenant.get("sessions", []):
+                self._sessions[session] = name
+
+    @classmethod
+    def from_settings(cls, on_evict=None):
+        settings = get_tenant_settings()
+        return cls(
+            load_tenant_config(settings["config_path"]),
+            max_active_tenants=settings["max_active_tenants"],
+            cache_total_entries=settings["cache_total_entries"],
+            requests_per_minute=settings["requests_per_minute"],
+            tokens_per_minute=settings["tokens_per_minute"],
+            on_evict=on_evict,
+        )
+
+    def tenant_for(self, user_id=None, session_id=None):
+        if user_id in self._users:
+            return self._users[user_id]
+        if session_id in self._sessions:
+            return self._sessions[session_id]
+        return DEFAULT_TENANT
+
+    def tenant_config(self, name):
+        if name == DEFAULT_TENANT:
+            return self.config["default"]
+        return self.config["tenants"].get(name, {})
+
+    def collection_for(self, name):
+        return self.tenant_config(name).get(
+            "collection", self.config["default"].get("collection", DEFAULT_COLLECTION)
+        )
+
+    def _quota(self, name):
+        """The tenant's quota (call under _lock); the default tenant is unlimited unless configured."""
+        if name not in self._quotas:
+            tenant = self.tenant_config(name)
+            if name == DEFAULT_TENANT:
+                limits = (tenant.get("requests_per_minute"), tenant.get("tokens_per_minute"))
+            else:
+                limits = (
+                    tenant.get("requests_per_minute", self.requests_per_minute),
+                    tenant.get("tokens_per_minute", self.tokens_per_minute),
+                )
+            self._quotas[name] = TenantQuota(name, *limits)
+        return self._quotas[name]
+
+    def _build(self, name):
+        tenant = self.tenant_config(name)
+        cache_settings = get_semantic_cache_settings()
+        cache = None
+        if cache_settings["enabled"]:
+            cache = SemanticCache(
+                threshold=cache_settings["threshold"],
+                max_entries=min(cache_settings["max_entries"], self.cache_entries),
+                ttl_seconds=cache_settings["ttl_seconds"],
+            )
+        return TenantContext(
+            name,
+            self.collection_for(name),
+            self._quota(name),
+            cache=cache,
+            filters=tenant.get("filters"),
+        )
+
+    def route(self, user_id=None, session_id=None):
+        name = self.tenant_for(user_id, session_id)
+        evicted = []
+        with self._lock:
+            if name in self._contexts:
+                self._contexts.move_to_end(name)
+                return self._contexts[name]
+            context = self._build(name)
+            self._contexts[name] = context
+            while len(self._contexts) > self.max_active_tenants:
+                evicted.append(self._contexts.popitem(last=False)[1])
+            active = {c.collection for c in self._contexts.values()}
+
+        for old in evicted:
+            # another active tenant may still search the same collection
+            if self.on_evict is not None and old.collection not in active:
+                self.on_evict(old)
+        return context
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_tenants": len(self._contexts),
+                "tenants_with_quotas": len(self._quotas),
+                "max_active_tenants": self.max_active_tenants,
+                "cache_entries_per_tenant": self.cache_entries,
+                "tenants": {
+                    name: context.cache.stats() if context.cache is not None else {}
+                    for name, context in self._contexts.items()
+                },
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(on_evict=None):
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = TenantRouter.from_settings(on_evict=on_evict)
+        return _router
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_text_splitters")
+
+from langchain_core.documents import Document
+
+from chunking import StructureAwareSplitter, classify_blocks, heading_level
+
+# text as PyPDF extracts it: running header, page number lines, labels
+PAGE = """SQL Tutorial
+21
+2.3 Filtering Rows
+Create a table of employees first, then select the rows you need
+with a WHERE clause. Update the salaries afterwards if required.
+SELECT name, salary
+FROM Employees
+WHERE salary > 50000
+Output: Name Salary
+Select the rows again after the update
+to check the result.
+- 22 -
+"""
+
+
+@pytest.mark.parametrize("line", ["21", "- 22 -", "3 / 40", "Output: Name Salary", "Note: Joins"])
+def test_page_numbers_and_labels_are_not_headings(line):
+    assert heading_level(line) is None
+
+
+@pytest.mark.parametrize("line, level", [
+    ("SQL TUTORIAL", 1),
+    ("2.3 Filtering Rows", 3),
+    ("Chapter 3: Joins", 4),
+    ("Filtering Rows", 4),
+])
+def test_headings(line, level):
+    assert heading_level(line) == level
+
+
+def test_pypdf_page():
+    blocks = classify_blocks(PAGE)
+    headings = [b[1] for b in blocks if b[0] == "heading"]
+    code = [b[1] for b in blocks if b[0] == "code"]
+
+    assert headings == ["SQL Tutorial", "2.3 Filtering Rows"]
+    assert code == ["SELECT name, salary\nFROM Employees\nWHERE salary > 50000"]
+    # prose starting with Create/Select/Update is not SQL
+    assert any(b[0] == "prose" and b[1].startswith("Create a table") for b in blocks)
+    assert any(b[0] == "prose" and "Select the rows again" in b[1] for b in blocks)
+
+
+def test_statement_stops_at_heading():
+    text = "SELECT *\nFROM Employees\n3.1 Joins\nJoins combine rows from two tables."
+    blocks = classify_blocks(text)
+    assert blocks[0] == ("code", "SELECT *\nFROM Employees")
+    assert blocks[1] == ("heading", "3.1 Joins", 3)
+
+
+def test_create_table_columns_stay_in_one_block():
+    text = "CREATE TABLE Employees (\nid INT PRIMARY KEY,\nName VARCHAR(50),\nSalary INT\n);"
+    assert classify_blocks(text) == [("code", text)]
+
+
+def test_page_numbers_do_not_enter_heading_path():
+    pages = [Document(page_content=PAGE, metadata={"page": 20})]
+    chunks = StructureAwareSplitter(chunk_size=400, chunk_overlap=0).split_documents(pages)
+    for chunk in chunks:
+        assert "21" not in chunk.metadata["heading_path"].split(" > ")
+        assert "22" not in chunk.metadata["heading_path"]
@@ -0,0 +1,75 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import reranking
+
+
+class SlowReranker:
+    """Cross-encoder stand-in taking 10 ms per (question, chunk) pair."""
+
+    name = "slow"
+
+    def __init__(self, batch_size=32):
+        self.batch_size = batch_size
+        self.batches = []
+
+    def score(self, question, texts):
+        self.batches.append(len(texts))
+        time.sleep(0.01 * len(texts))
+        return [float(i) for i in range(len(texts))]
+
+
+@pytest.fixture
+def default_settings(monkeypatch):
+    for name in ("RAG_RERANK_FETCH_K", "RAG_RERANK_BUDGET_MS", "RAG_RERANK_BATCH_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+    return reranking.get_rerank_settings()
+
+
+def candidates(n):
+    return [SimpleNamespace(page_content=f"chunk {i}") for i in range(n)]
+
+
+def test_slow_reranker_falls_back_under_default_settings(default_settings, monkeypatch):
+    slow = SlowReranker(batch_size=default_settings["batch_size"])
+    monkeypatch.setattr(reranking, "get_reranker", lambda: slow)
+    docs = candidates(default_settings["fetch_k"])
+
+    ranked, stats = reranking.rerank_documents("question", docs, top_n=5)
+
+    assert stats["rerank_fallback"] is True
+    assert ranked == docs[:5]
+    # the budget was checked between batches, not after one big batch
+    assert len(slow.batches) > 1
+    assert max(slow.batches) <= default_settings["fetch_k"] // 4
+
+
+def test_batch_finishing_past_the_deadline_is_not_used(default_settings, monkeypatch):
+    slow = SlowReranker(batch_size=1)
+    monkeypatch.setattr(reranking, "get_reranker", lambda: slow)
+    monkeypatch.setenv("RAG_RERANK_BUDGET_MS", "15")
+    docs = candidates(2)
+
+    ranked, stats = reranking.rerank_documents("question", docs, top_n=2)
+
+    # every candidate was scored, but the last batch ended past the budget
+    assert slow.batches == [1, 1]
+    assert stats["rerank_fallback"] is True
+    assert ranked == docs
+
+
+def test_fast_reranker_reorders(default_settings, monkeypatch):
+    monkeypatch.setattr(reranking, "get_reranker", lambda: reranking.LexicalOverlapReranker())
+    docs = [
+        SimpleNamespace(page_content="window functions rank rows"),
+        SimpleNamespace(page_content="COALESCE returns the first non-null argument"),
+    ]
+
+    ranked, stats = reranking.rerank_documents("what does COALESCE return", docs, top_n=1)
+
+    assert stats["rerank_fallback"] is False
+    assert ranked == [docs[1]]
@@ -0,0 +1,269 @@
+import threading
+
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_postgres import PGVector
+
+from config import get_db_url, get_gemini_api_key, get_vector_pool_settings, get_ann_search_settings
+from embedding_cache import wrap_embeddings
+from hybrid_retrieval import HybridRetriever
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
+
+
+def ann_search_statements(settings):
+    statements = [
+        f"SET hnsw.ef_search = {int(settings['hnsw_ef_search'])}",
+        f"SET ivfflat.probes = {int(settings['ivfflat_probes'])}",
+    ]
+    # pgvector >= 0.8: keep scanning when the collection filter removes
+    # most of the nearest neighbours
+    iterative = settings["iterative_scan"]
+    if iterative in ("off", "strict_order", "relaxed_order"):
+        statements.append(f"SET hnsw.iterative_scan = {iterative}")
+        statements.append(
+            f"SET ivfflat.iterative_scan = {'relaxed_order' if iterative == 'relaxed_order' else 'off'}"
+        )
+    return statements
+
+
+def apply_ann_search_settings(dbapi_conn, connection_record=None):
+    """Set HNSW/IVFFlat query knobs on every new pooled connection.
+
+    Each SET is committed on its own so an older pgvector that lacks a
+    setting does not undo the others.
+    """
+    for statement in ann_search_statements(get_ann_search_settings()):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute(statement)
+            dbapi_conn.commit()
+        except Exception as e:
+            dbapi_conn.rollback()
+            print(f"ANN search setting skipped ({statement}): {e}")
+        finally:
+            cur.close()
+
+
+class RetrieverRegistry:
+    """Process-wide cache of PGVector stores and retrievers.
+
+    One pooled SQLAlchemy engine is shared by every store, and one
+    embeddings client is kept per model, so answering a question no
+    longer pays for client setup or a fresh database connection.
+    """
+
+    def __init__(self, db_url=None, pool_settings=None):
+        self._db_url = db_url
+        self._pool_settings = pool_settings or get_vector_pool_settings()
+        self._lock = threading.RLock()
+        self._engine = None
+        self._async_engine = None
+        self._embeddings = {}
+        self._stores = {}
+        self._async_stores = {}
+        self._retrievers = {}
+
+    def get_engine(self):
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(
+                    self._db_url or get_db_url(),
+                    pool_size=self._pool_settings["pool_size"],
+                    max_overflow=self._pool_settings["max_overflow"],
+                    pool_timeout=self._pool_settings["pool_timeout"],
+                    pool_recycle=self._pool_settings["pool_recycle"],
+                    # validate connections on checkout so a replica survives
+                    # database restarts without serving broken connections
+                    pool_pre_ping=True,
+                )
+                event.listen(self._engine, "connect", apply_ann_search_settings)
+            return self._engine
+
+    def get_async_engine(self):
+        with self._lock:
+            if self._async_engine is None:
+                # psycopg 3 serves both sync and asyncio connections
+                url = make_url(self._db_url or get_db_url()).set(
+                    drivername="postgresql+psycopg"
+                )
+                self._async_engine = create_async_engine(
+                    url,
+                    pool_size=self._pool_settings["pool_size"],
+                    max_overflow=self._pool_settings["max_overflow"],
+                    pool_timeout=self._pool_settings["pool_timeout"],
+                    pool_recycle=self._pool_settings["pool_recycle"],
+                    pool_pre_ping=True,
+                )
+                # connect events fire on the sync facade of async connections
+                event.listen(self._async_engine.sync_engine, "connect", apply_ann_search_settings)
+            return self._async_engine
+
+    def get_embeddings(self, model=DEFAULT_EMBEDDING_MODEL):
+        with self._lock:
+            if model not in self._embeddings:
+                self._embeddings[model] = wrap_embeddings(
+                    GoogleGenerativeAIEmbeddings(
+                        model=model,
+                        google_api_key=get_gemini_api_key()
+                    ),
+                    model_name=model
+                )
+            return self._embeddings[model]
+
+    def get_vectorstore(self, collection_name, embedding_model=DEFAULT_EMBEDDING_MODEL):
+        key = (collection_name, embedding_model)
+        with self._lock:
+            if key not in self._stores:
+                self._stores[key] = PGVector(
+                    connection=self.get_engine(),
+                    embeddings=self.get_embeddings(embedding_model),
+                    collection_name=collection_name,
+                    use_jsonb=True
+                )
+            return self._stores[key]
+
+    def get_async_vectorstore(self, collection_name, embedding_model=DEFAULT_EMBEDDING_MODEL):
+        key = (collection_name, embedding_model)
+        with self._lock:
+            if key not in self._async_stores:
+                self._async_stores[key] = PGVector(
+                    connection=self.get_async_engine(),
+                    embeddings=self.get_embeddings(embedding_model),
+                    collection_name=collection_name,
+                    use_jsonb=True,
+                    async_mode=True
+                )
+            return self._async_stores[key]
+
+    def get_retriever(self, collection_name, k=4, embedding_model=DEFAULT_EMBEDDING_MODEL):
+        key = (collection_name, k, embedding_model)
+        with self._lock:
+            if key not in self._retrievers:
+                vectorstore = self.get_vectorstore(collection_name, embedding_model)
+                self._retrievers[key] = vectorstore.as_retriever(
+                    search_kwargs={"k": k}
+                )
+            return self._retrievers[key]
+
+    def get_hybrid_retriever(self, collection_name, k=4, embedding_model=DEFAULT_EMBEDDING_MODEL):
+        key = ("hybrid", collection_name, k, embedding_model)
+        with self._lock:
+            if key not in self._retrievers:
+                self._retrievers[key] = HybridRetriever(
+                    vectorstore=self.get_vectorstore(collection_name, embedding_model),
+                    engine=self.get_engine(),
+                    collection_name=collection_name,
+                    k=k
+                )
+            return self._retrievers[key]
+
+    def release_collection(self, collection_name):
+        """Drop cached stores and retrievers of one collection."""
+        with self._lock:
+            for cache in (self._stores, self._async_stores):
+                for key in [k for k in cache if k[0] == collection_name]:
+                    del cache[key]
+            for key in list(self._retrievers):
+                if collection_name in key[:2]:
+                    del self._retrievers[key]
+
+    def warm_up(self, collection_name, k=4, embedding_model=DEFAULT_EMBEDDING_MODEL):
+        retriever = self.get_retriever(collection_name, k, embedding_model)
+        self.check_health()
+        return retriever
+
+    def collection_fingerprint(self, collection_name):
+        """Cheap signature of a collection's contents.
+
+        Changes whenever chunks are added, removed or re-ingested under new
+        ids, so caches built on top of the collection can tell when they
+        are stale.
+        """
+        with self.get_engine().connect() as conn:
+            row = conn.execute(
+                text("""
+                    SELECT COUNT(e.id), COALESCE(SUM(hashtext(e.id)::bigint), 0)
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+                    WHERE c.name = :name
+                """),
+                {"name": collection_name}
+            ).one()
+        return (row[0], row[1])
+
+    def collection_ids(self, collection_name, source=None, tenant=None):
+        """Ids stored in a collection, optionally only those of one source.
+
+        With a source, only chunks of the given tenant (or untagged chunks
+        when tenant is None) are returned.
+        """
+        query = """
+            SELECT e.id
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+            WHERE c.name = :name
+        """
+        params = {"name": collection_name}
+        if source is not None:
+            query += " AND e.cmetadata->>'source' = :source"
+            params["source"] = source
+            if tenant is None:
+                query += " AND NOT (e.cmetadata ? 'tenant')"
+            else:
+                query += " AND e.cmetadata->>'tenant' = :tenant"
+                params["tenant"] = tenant
+
+        with self.get_engine().connect() as conn:
+            rows = conn.execute(text(query), params).all()
+        return {row[0] for row in rows}
+
+    def check_health(self):
+        try:
+            with self.get_engine().connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            print(f"Vector store health check failed: {e}")
+            return False
+
+    def pool_status(self):
+        with self._lock:
+            if self._engine is None:
+                return {
+                    "initialized": False,
+                    **self._pool_settings,
+                }
+            pool = self._engine.pool
+
+        return {
+            "initialized": True,
+            **self._pool_settings,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "current_size": pool.size(),
+            "retrievers_cached": len(self._retrievers),
+        }
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = None
+            self._stores.clear()
+            self._async_stores.clear()
+            self._retrievers.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = RetrieverRegistry()
+        return _registry